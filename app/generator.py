@@ -1,5 +1,6 @@
 import re
 import os
+import json
 import requests
 from pypdf import PdfReader
 import docx
@@ -9,6 +10,9 @@ import streamlit as st
 #BACKEND_URL = "http://127.0.0.1:8000/generate" #"https://interview-scoutiq.onrender.com/generate" 
 BASE_BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
 BACKEND_URL = f"{BASE_BACKEND_URL}/generate"
+STREAM_BACKEND_URL = f"{BASE_BACKEND_URL}/generate/stream"
+BATCH_BACKEND_URL = f"{BASE_BACKEND_URL}/generate/batch"
+PARSE_BATCH_BACKEND_URL = f"{BASE_BACKEND_URL}/parse-resumes/batch"
 
 
 def run_prompt_chain(jd_text, resume_text):
@@ -83,6 +87,102 @@ def run_prompt_chain(jd_text, resume_text):
             "skill_gaps": None
         }
 
+def stream_prompt_chain(jd_text, resume_text):
+    """Yield generation events from the streaming backend as they arrive"""
+    if 'id_token' not in st.session_state:
+        st.error("Authentication token not found. Please log in again")
+        return
+    headers = {"Authorization": f"Bearer {st.session_state.id_token}"}
+
+    try:
+        with requests.post(
+            STREAM_BACKEND_URL,
+            json={"jd": jd_text, "resume": resume_text},
+            headers=headers,
+            timeout=90,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("event") == "error":
+                    st.error(f"❌ {event.get('error')}")
+                    return
+                yield event
+
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 429:
+            st.error("⏱️ Rate limit reached. Please wait a moment and try again.")
+        else:
+            st.error(f"❌ Server error: {e.response.status_code}")
+    except requests.exceptions.Timeout:
+        st.error("⏱️ Request timed out. Please try again.")
+    except requests.exceptions.RequestException as e:
+        st.error("❌ Network error. Please check your connection.")
+        print(f"Request error: {e}")
+
+def stream_batch_prompt_chain(jd_text, resumes):
+    """Yield per-candidate events for (name, resume_text) pairs as each one finishes"""
+    if 'id_token' not in st.session_state:
+        st.error("Authentication token not found. Please log in again")
+        return
+    headers = {"Authorization": f"Bearer {st.session_state.id_token}"}
+
+    try:
+        with requests.post(
+            BATCH_BACKEND_URL,
+            json={"jd": jd_text, "resumes": [{"name": name, "resume": text} for name, text in resumes]},
+            headers=headers,
+            timeout=180,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 429:
+            st.error("⏱️ Rate limit reached. Please wait a moment and try again.")
+        else:
+            st.error(f"❌ Server error: {e.response.status_code}")
+    except requests.exceptions.Timeout:
+        st.error("⏱️ Request timed out. Please try again.")
+    except requests.exceptions.RequestException as e:
+        st.error("❌ Network error. Please check your connection.")
+        print(f"Request error: {e}")
+
+def parse_resumes_batch(resume_texts):
+    """Parse and save several resumes in one request; returns the backend's summary or None"""
+    if 'id_token' not in st.session_state:
+        st.error("Authentication token not found. Please log in again")
+        return None
+    headers = {"Authorization": f"Bearer {st.session_state.id_token}"}
+
+    try:
+        response = requests.post(
+            PARSE_BATCH_BACKEND_URL,
+            json={"resumes": [{"resume_text": text} for text in resume_texts]},
+            headers=headers,
+            timeout=180
+        )
+        response.raise_for_status()
+        return response.json()
+
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 429:
+            st.error("⏱️ Rate limit reached. Please wait a moment and try again.")
+        else:
+            st.error(f"❌ Server error: {e.response.status_code}")
+    except requests.exceptions.Timeout:
+        st.error("⏱️ Request timed out. Please try again.")
+    except requests.exceptions.RequestException as e:
+        st.error("❌ Network error. Please check your connection.")
+        print(f"Request error: {e}")
+    return None
+
 def extract_text_from_pdf(file) -> str:
     reader = PdfReader(file)
     text = ""
@@ -4,7 +4,10 @@ from app.usage_tracker import get_today_usage, increment_today_usage
 from firebase_admin import credentials, firestore
 import streamlit as st
 import json
-from app.generator import run_prompt_chain, extract_text_from_pdf, extract_text_from_docx, generate_pdf
+from app.generator import (
+    stream_prompt_chain, stream_batch_prompt_chain, parse_resumes_batch,
+    extract_text_from_pdf, extract_text_from_docx, generate_pdf
+)
 from io import BytesIO
 from datetime import datetime
 
@@ -60,15 +63,19 @@ def log_usage_to_firestore(email):
     except Exception as e:
         print(f"❌ Firestore logging error for {email}: {e}")
 
-# Pro user check
+# Pro user check (cached briefly so reruns don't hit Firestore every time)
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_user_tier(email):
+    doc_ref = firestore.client().collection("pro_users").document(email.lower())
+    doc = doc_ref.get()
+    if doc.exists and doc.to_dict().get("pro", False):
+        return doc.to_dict().get("tier", "monthly")  # default to monthly if missing
+    else:
+        return "free"
+
 def is_pro_user(email):
     try:
-        doc_ref = firestore.client().collection("pro_users").document(email.lower())
-        doc = doc_ref.get()
-        if doc.exists and doc.to_dict().get("pro", False):
-            return doc.to_dict().get("tier", "monthly")  # default to monthly if missing
-        else:
-            return "free"
+        return _fetch_user_tier(email)
     except Exception as e:
         st.warning(f"Error checking pro status.")
         return False
@@ -152,22 +159,13 @@ def run_ui():
                 if len(all_resumes_texts)>1:
                     if st.button(f"Parse All {len(all_resumes_texts)} Resumes & Add to Database"):
                         with st.spinner(f"Batch processing {len(all_resumes_texts)} resumes... This may take a moment."):
-                            parsed_count = 0
-                            for name, text in all_resumes_texts:
-                                try:
-                                    id_token = st.session_state.id_token
-                                    headers = {"Authorization": f"Bearer {id_token}"}
-                                    response = requests.post(
-                                        f"{BASE_BACKEND_URL}/parse-resume",
-                                        json={"resume_text": text},
-                                        headers=headers,
-                                        timeout=60
-                                    )
-                                    response.raise_for_status()
-                                    parsed_count += 1
-                                except Exception as e:
-                                    st.error(f"Failed to parse {name}: {e}")
-                            st.success(f"Successfully parsed and saved {parsed_count} / {len(all_resumes_texts)} resumes to your database.")
+                            summary = parse_resumes_batch([text for _, text in all_resumes_texts])
+                            if summary:
+                                for result in summary["results"]:
+                                    if result["status"] == "error":
+                                        name = all_resumes_texts[result["index"]][0]
+                                        st.error(f"Failed to parse {name}: {result['error']}")
+                                st.success(f"Successfully parsed and saved {summary['parsed']} / {len(all_resumes_texts)} resumes to your database.")
                 else:
                     if st.button("Parse & Save Resume to Database"):
                         with st.spinner("Parsing and saving resume..."):
@@ -230,24 +228,25 @@ def run_ui():
         if jd_input.strip() == "" or resume_text.strip() == "":
             st.warning("Please provide both Job Description and at least one Resume.")
         else:
+            section_titles = {
+                "technical": "🔧 Technical Questions",
+                "behavioral": "💬 Behavioral Questions",
+                "followup": "⚠️ Red Flag / Follow-up Questions",
+            }
             with st.spinner("Generating questions..."):
-                # Run the prompt chain
-                results = run_prompt_chain(jd_input, resume_text)
-                #st.text_area("🧪 Raw Model Output", value="\n".join(results['technical'] + results['behavioral'] + results['followup']), height=250)
-
-                if results.get("technical"):
-                    st.subheader("🔧 Technical Questions")
-                    for q in results['technical']:
-                        st.markdown(f"{q}")
-
-                    st.subheader("💬 Behavioral Questions")
-                    for q in results['behavioral']:
-                        st.markdown(f"{q}")
-
-                    st.subheader("⚠️ Red Flag / Follow-up Questions")
-                    for q in results['followup']:
-                        st.markdown(f"{q}")
-
+                # Stream questions onto the page as soon as each one is complete
+                results = None
+                shown_sections = set()
+                for event in stream_prompt_chain(jd_input, resume_text):
+                    if event["event"] == "question":
+                        if event["section"] not in shown_sections:
+                            st.subheader(section_titles[event["section"]])
+                            shown_sections.add(event["section"])
+                        st.markdown(f"{event['text']}")
+                    elif event["event"] == "done":
+                        results = event["result"]
+
+                if results and results.get("technical"):
                     # Check if Pro content exists in response
                     if results.get("insight_summary"):
                         st.markdown("---")
@@ -292,4 +291,49 @@ def run_ui():
                     if results:
                         st.json(results)
 
-
+    # Batch generation: one JD against every uploaded resume. Offered to paid
+    # tiers only, since the free daily limit above counts single generations
+    if len(all_resumes_texts) > 1 and user_tier != "free":
+        if st.button(f"🚀 Generate Questions for All {len(all_resumes_texts)} Resumes"):
+            if jd_input.strip() == "":
+                st.warning("Please provide a Job Description.")
+            else:
+                with st.spinner(f"Generating questions for {len(all_resumes_texts)} candidates..."):
+                    generated = 0
+                    # Candidates are shown in the order they finish
+                    for event in stream_batch_prompt_chain(jd_input, all_resumes_texts):
+                        if event["event"] == "candidate_error":
+                            st.error(f"❌ {event['name']}: {event['error']}")
+                        elif event["event"] == "candidate":
+                            results = event["result"]
+                            with st.expander(f"👤 {event['name']}", expanded=generated == 0):
+                                for section, title in (
+                                    ("technical", "🔧 Technical Questions"),
+                                    ("behavioral", "💬 Behavioral Questions"),
+                                    ("followup", "⚠️ Red Flag / Follow-up Questions"),
+                                ):
+                                    if results.get(section):
+                                        st.markdown(f"**{title}**")
+                                        for question in results[section]:
+                                            st.markdown(question)
+                                if results.get("insight_summary"):
+                                    st.markdown("**📊 Insight Summary**")
+                                    st.markdown(results["insight_summary"])
+                                if results.get("skill_gaps"):
+                                    st.markdown("**⚡ Skill Gap Highlights**")
+                                    st.markdown(results["skill_gaps"])
+
+                                st.download_button(
+                                    label="Download PDF",
+                                    data=generate_pdf(results['technical'], results['behavioral'], results['followup']),
+                                    file_name=f"interview_questions_{event['index'] + 1}.pdf",
+                                    mime="application/pdf",
+                                    key=f"batch_pdf_{event['index']}"
+                                )
+                            generated += 1
+                            log_usage_to_firestore(user_email)
+                        elif event["event"] == "done":
+                            st.success(
+                                f"Generated questions for {generated} / {event['count']} candidates "
+                                f"({event['cached']} from cache)."
+                            )
@@ -109,11 +109,12 @@ try:
     col1, col2 = st.columns(2)
     
     with col1:
-        st.metric("Tokens Used", f"{embedding['estimated_tokens_used']:,}")
+        st.metric("Tokens Used", f"{embedding['tokens_used']:,}")
         st.metric("Tokens Remaining", f"{embedding['tokens_remaining']:,}")
     
     with col2:
         st.metric("Percentage Used", embedding["percentage_used"])
+        st.metric("Embedding Calls", f"{embedding['embedding_calls']:,}")
         st.info(f"Model: {embedding['model']}")
     
     # Progress bar
@@ -127,27 +128,64 @@ try:
     
     # === PRO USERS TABLE ===
     st.header("💎 Pro Users")
-    pro_users_resp = requests.get(f"{BASE_BACKEND_URL}/admin/pro-users", headers=headers)
+    if "pro_users_cursors" not in st.session_state:
+        st.session_state.pro_users_cursors = [None]  # start_after cursor for each visited page
+
+    pro_users_resp = requests.get(
+        f"{BASE_BACKEND_URL}/admin/pro-users",
+        params={"limit": 50, "start_after": st.session_state.pro_users_cursors[-1]},
+        headers=headers
+    )
     pro_users_resp.raise_for_status()
-    pro_users_df = pd.DataFrame(pro_users_resp.json())
+    pro_users_page = pro_users_resp.json()
+    pro_users_df = pd.DataFrame(pro_users_page["items"])
     
     if not pro_users_df.empty:
         st.dataframe(pro_users_df, use_container_width=True)
-        st.metric("Total Pro Users", len(pro_users_df))
+        st.metric("Total Pro Users", users["pro_users"])
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(st.session_state.pro_users_cursors) > 1 and st.button("⬅️ Previous page"):
+                st.session_state.pro_users_cursors.pop()
+                st.rerun()
+        with col2:
+            if pro_users_page["next_cursor"] and st.button("Next page ➡️"):
+                st.session_state.pro_users_cursors.append(pro_users_page["next_cursor"])
+                st.rerun()
     else:
         st.info("No pro users yet")
     
     st.markdown("---")
     
     # === USAGE LOGS TABLE ===
-    st.header("📝 Recent Usage Logs")
-    usage_logs_resp = requests.get(f"{BASE_BACKEND_URL}/admin/usage-logs", headers=headers)
+    # Paged by document id: the collection mixes per-event entries and
+    # per-email summaries, which don't share a date field to sort on.
+    st.header("📝 Usage Logs")
+    if "usage_logs_cursors" not in st.session_state:
+        st.session_state.usage_logs_cursors = [None]
+
+    usage_logs_resp = requests.get(
+        f"{BASE_BACKEND_URL}/admin/usage-logs",
+        params={"limit": 50, "start_after": st.session_state.usage_logs_cursors[-1]},
+        headers=headers
+    )
     usage_logs_resp.raise_for_status()
-    usage_logs_df = pd.DataFrame(usage_logs_resp.json())
+    usage_logs_page = usage_logs_resp.json()
+    usage_logs_df = pd.DataFrame(usage_logs_page["items"])
     
     if not usage_logs_df.empty:
-        # Show last 50 logs
-        st.dataframe(usage_logs_df.tail(50), use_container_width=True)
+        st.dataframe(usage_logs_df, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(st.session_state.usage_logs_cursors) > 1 and st.button("⬅️ Previous logs"):
+                st.session_state.usage_logs_cursors.pop()
+                st.rerun()
+        with col2:
+            if usage_logs_page["next_cursor"] and st.button("Next logs ➡️"):
+                st.session_state.usage_logs_cursors.append(usage_logs_page["next_cursor"])
+                st.rerun()
     else:
         st.info("No usage logs yet")
 
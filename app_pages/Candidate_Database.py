@@ -27,7 +27,39 @@ id_token = st.session_state.id_token
 headers = {"Authorization": f"Bearer {id_token}"}
 BASE_BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
 
+PAGE_SIZE = 10
+
 jd_input = st.text_area("Paste Job Description to rank your candidates", height=200)
+min_score = st.slider(
+    "Semantic similarity cutoff", min_value=0.0, max_value=1.0, value=0.0, step=0.05,
+    help="Candidates below this similarity to the JD are left out. It does not "
+         "cut off the relevance shown below, which also weighs keyword matches."
+)
+
+
+def fetch_ranking(jd, offset, score_threshold):
+    """
+    One page of ranked candidates (the backend reuses the JD embedding across pages)
+
+    Returns (candidates, next_offset, has_more): a page can be shorter than
+    PAGE_SIZE without being the last, so paging follows the backend's headers.
+    """
+    response = requests.post(
+        f"{BASE_BACKEND_URL}/rank-candidates",
+        json={
+            "jd": jd,
+            "limit": PAGE_SIZE,
+            "offset": offset,
+            "score_threshold": score_threshold or None
+        },
+        headers=headers,
+        timeout=60
+    )
+    response.raise_for_status()
+    next_offset = int(response.headers.get("X-Next-Offset", offset + PAGE_SIZE))
+    has_more = response.headers.get("X-Has-More", "false") == "true"
+    return response.json(), next_offset, has_more
+
 
 if st.button("🏆 Rank Candidates"):
     if not jd_input.strip():
@@ -35,33 +67,62 @@ if st.button("🏆 Rank Candidates"):
     else:
         with st.spinner("Ranking candidates from your database..."):
             try:
-                response = requests.post(
-                    f"{BASE_BACKEND_URL}/rank-candidates",
-                    json={"jd": jd_input},
-                    headers=headers,
-                    timeout=60
-                )
-                response.raise_for_status()
-                candidates = response.json()
-
-                if not candidates:
-                    st.info("No matching candidates found in your database.")
-                else:
-                    st.subheader(f"Top {len(candidates)} Matches:")
-                    # Sort candidates by relevance (order returned by backend)
-                    # We need to re-match with the search results order,
-                    # as firestore's get_all doesn't guarantee order.
-
-                    # A simple display for now:
-                    for i, candidate in enumerate(candidates):
-                        with st.expander(f"**#{i+1} - {candidate.get('full_name')}**"):
-                            st.write(f"**Email:** {candidate.get('email', 'N/A')}")
-                            st.write(f"**Summary:** {candidate.get('summary', 'N/A')}")
-                            skills_list = [s.get('name') for s in candidate.get('skills',) if s.get('name')]
-                            st.write(f"**Skills:** {', '.join(skills_list)}")
-
+                page, next_offset, has_more = fetch_ranking(jd_input, 0, min_score)
+                st.session_state.ranked_candidates = page
+                st.session_state.ranked_query = (jd_input, min_score)
+                st.session_state.ranking_next_offset = next_offset
+                st.session_state.ranking_exhausted = not has_more
+                st.session_state.candidate_details = {}
             except Exception as e:
                 st.error(f"Failed to rank candidates: {e}")
 
+if 'ranked_candidates' in st.session_state:
+    candidates = st.session_state.ranked_candidates
+    details = st.session_state.setdefault('candidate_details', {})
+
+    if not candidates:
+        st.info("No matching candidates found in your database.")
+    else:
+        st.subheader(f"Top {len(candidates)} Matches:")
+        # Candidates arrive in rank order, with the display fields only
+        for i, candidate in enumerate(candidates):
+            candidate_id = candidate.get('firestore_id')
+            with st.expander(f"**#{i+1} - {candidate.get('full_name')}** (relevance {candidate.get('relevance_score', 0):.3f})"):
+                st.write(f"**Email:** {candidate.get('email') or 'N/A'}")
+                st.write(f"**Summary:** {candidate.get('summary') or 'N/A'}")
+                skills_list = [s.get('name') for s in candidate.get('skills', []) if s.get('name')]
+                st.write(f"**Skills:** {', '.join(skills_list)}")
+
+                if candidate_id in details:
+                    detail = details[candidate_id]
+                    if detail.get('phone'):
+                        st.write(f"**Phone:** {detail['phone']}")
+                    st.write("**Experience:**")
+                    for exp in detail.get('experience', []):
+                        st.write(f"- {exp.get('job_title')} at {exp.get('company')} ({exp.get('duration')}): {exp.get('summary')}")
+                elif st.button("Show full profile", key=f"details_{candidate_id}"):
+                    try:
+                        response = requests.get(
+                            f"{BASE_BACKEND_URL}/candidates/{candidate_id}",
+                            headers=headers,
+                            timeout=30
+                        )
+                        response.raise_for_status()
+                        details[candidate_id] = response.json()
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Failed to load candidate: {e}")
+
+    if not st.session_state.get('ranking_exhausted') and st.button("Load more candidates"):
+        try:
+            jd, score_threshold = st.session_state.ranked_query
+            page, next_offset, has_more = fetch_ranking(jd, st.session_state.ranking_next_offset, score_threshold)
+            candidates.extend(page)
+            st.session_state.ranking_next_offset = next_offset
+            st.session_state.ranking_exhausted = not has_more
+            st.rerun()
+        except Exception as e:
+            st.error(f"Failed to load more candidates: {e}")
+
 st.markdown("---")
 st.markdown("Upload new resumes in the `App` page to add them to your database.")
\ No newline at end of file
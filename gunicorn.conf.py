@@ -0,0 +1,22 @@
+"""
+Gunicorn settings picked up automatically from the working directory
+
+Sets up prometheus_client multiprocess mode so /metrics aggregates every
+worker: each worker writes its samples under PROMETHEUS_MULTIPROC_DIR,
+which is wiped on startup and cleaned up as workers exit.
+"""
+import os
+import shutil
+
+multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/scoutiq_prometheus")
+
+
+def on_starting(server):
+    # Stale files from a previous run would be summed into the new one
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -4,6 +4,9 @@ Analytics and feature usage tracking
 from firebase_admin import firestore
 import logging
 
+from llm_backend.firestore_io import run_firestore
+from llm_backend.rollups import rollup_aggregator
+
 logger = logging.getLogger(__name__)
 
 
@@ -11,7 +14,8 @@ async def track_feature_usage(
     user_uid: str,
     feature: str,
     metadata: dict = None,
-    db: firestore.Client = None
+    db: firestore.Client = None,
+    user_email: str = None
 ):
     """
     Track feature usage for analytics
@@ -21,10 +25,17 @@ async def track_feature_usage(
         feature: Feature name (e.g., "generate_questions", "parse_resume")
         metadata: Additional context (tier, input lengths, etc.)
         db: Firestore client
+        user_email: User's email (shown in top-user rollups)
     """
     try:
         if db:
-            db.collection("feature_usage").add({
+            rollup_aggregator.add_feature(
+                feature,
+                user_uid,
+                tier=(metadata or {}).get("tier"),
+                user_email=user_email
+            )
+            await run_firestore(db.collection("feature_usage").add, {
                 "user_uid": user_uid,
                 "feature": feature,
                 "metadata": metadata or {},
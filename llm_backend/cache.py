@@ -1,22 +1,210 @@
 """
 Caching utilities for LLM responses
+
+Two tiers:
+- L1: bounded in-process LRU+TTL cache (per worker, microsecond lookups)
+- L2: Firestore "llm_cache" collection (shared across workers, 24hr TTL)
 """
+import os
+import sys
+import json
+import time
+import asyncio
 import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from firebase_admin import firestore
 import logging
 
+from llm_backend.firestore_io import run_firestore, run_firestore_job
+from llm_backend.prometheus import record_cache_lookup
+
 logger = logging.getLogger(__name__)
 
+CACHE_TTL = timedelta(hours=24)
+
+
+class L1Cache:
+    """
+    Bounded in-memory LRU cache with per-entry TTL
+
+    Entries are evicted least-recently-used first once either the entry
+    count or the approximate byte size exceeds its cap.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(value) -> int:
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return sys.getsizeof(value)
+
+    def get(self, key: str):
+        """Return the cached value or None (refreshes LRU position on hit)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value, ttl_seconds: float = None):
+        """Insert or replace an entry, evicting LRU entries to stay within caps"""
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
+
+
+l1_cache = L1Cache(
+    max_entries=int(os.getenv("L1_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("L1_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+# cache_key -> asyncio.Task currently computing that key's result
+_inflight = {}
+_coalesced_count = 0
+
+
+def get_cache_stats() -> dict:
+    """In-process (L1) cache statistics for this worker"""
+    return l1_cache.stats()
+
+
+def get_inflight_stats() -> dict:
+    """Single-flight statistics for this worker"""
+    return {"in_flight": len(_inflight), "coalesced": _coalesced_count}
+
+
+def _release_inflight(key: str, task: asyncio.Task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Mark the exception as retrieved even if every waiter went away
+    if not task.cancelled():
+        task.exception()
+
+
+async def single_flight(key: str, func):
+    """
+    Coalesce concurrent calls for the same key into one execution
+
+    The first caller starts func() as a task; callers arriving while it is
+    still running await the same task instead of starting their own. The
+    task is shielded, so a disconnecting caller does not cancel the work
+    the others are waiting on.
+
+    Args:
+        key: Coalescing key (e.g. generate_cache_key output)
+        func: Zero-argument coroutine function producing the result
+
+    Returns:
+        Tuple of (result, coalesced) where coalesced is True if this
+        caller joined an already in-flight execution
+    """
+    global _coalesced_count
+
+    task = _inflight.get(key)
+    coalesced = task is not None
+
+    if coalesced:
+        _coalesced_count += 1
+        logger.info("Joining in-flight request")
+    else:
+        task = asyncio.ensure_future(func())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _release_inflight(key, t))
+
+    result = await asyncio.shield(task)
+    return result, coalesced
+
+
 def generate_cache_key(jd: str, resume: str, tier: str) -> str:
     """Generate unique cache key based on content + tier"""
     content = f"{jd}::{resume}::{tier}"
     return hashlib.sha256(content.encode()).hexdigest()
 
 
+def resume_content_hash(user_uid: str, resume_text: str) -> str:
+    """Per-user key for a resume, insensitive to whitespace and case changes"""
+    normalized = " ".join(resume_text.split()).casefold()
+    return hashlib.sha256(f"{user_uid}::{normalized}".encode()).hexdigest()
+
+
 async def get_cached_response(cache_key: str, db: "firestore.Client"):
     """
     Check if we have a cached response (24hr TTL)
+
+    Read-through: the in-process L1 cache is checked first, and Firestore
+    hits are promoted into L1 for the remainder of their TTL.
     
     Args:
         cache_key: Unique hash of the request
@@ -25,23 +213,33 @@ async def get_cached_response(cache_key: str, db: "firestore.Client"):
     Returns:
         Cached result dict or None if cache miss
     """
+    cached = l1_cache.get(cache_key)
+    record_cache_lookup("l1", cached is not None)
+    if cached is not None:
+        logger.info("L1 cache hit")
+        return cached
+
     try:
         cache_ref = db.collection("llm_cache").document(cache_key)
-        cached_doc = cache_ref.get()
+        cached_doc = await run_firestore(cache_ref.get)
 
         if cached_doc.exists:
             cached_data = cached_doc.to_dict()
             created_at = cached_data.get("created_at")
 
             if created_at:
-                cache_age = datetime.now() - created_at
-                if cache_age < timedelta(hours=24):
+                # Firestore hands back tz-aware timestamps for the naive value we stored
+                cache_age = datetime.now() - created_at.replace(tzinfo=None)
+                if cache_age < CACHE_TTL:
                     logger.info(f"cache hit(age: {cache_age.seconds//3600}h)")
+                    record_cache_lookup("firestore", True)
+                    l1_cache.set(cache_key, cached_data["result"], (CACHE_TTL - cache_age).total_seconds())
                     return cached_data["result"]
                 else:
                     logger.info(f"Cache expired (age: {cache_age.days}d {cache_age.seconds//3600}h)")
 
         logger.info("Cache miss")
+        record_cache_lookup("firestore", False)
         return None
     except Exception as e:
         logger.error(f"Cache lookup error: {e}")
@@ -49,7 +247,7 @@ async def get_cached_response(cache_key: str, db: "firestore.Client"):
     
 async def cache_response(cache_key: str, result: dict, tier: str, db: "firestore.Client"):
     """
-    Cache the LLM response for 24 hours
+    Cache the LLM response for 24 hours (write-through L1 + Firestore)
     
     Args:
         cache_key: Unique hash of the request
@@ -57,9 +255,11 @@ async def cache_response(cache_key: str, result: dict, tier: str, db: "firestore
         tier: User tier (free, monthly, yearly, lifetime)
         db: Firestore client
     """
+    l1_cache.set(cache_key, result)
+
     try:
         cache_ref = db.collection("llm_cache").document(cache_key)
-        cache_ref.set({
+        await run_firestore(cache_ref.set, {
             "result": result,
             "tier": tier,
             "created_at": datetime.now(),
@@ -80,8 +280,8 @@ async def cleanup_old_cache(db: "firestore.Client") -> int:
     Returns:
         Number of deleted entries
     """
-    try:
-        cutoff = datetime.now() - timedelta(hours=24)
+    def delete_old_docs() -> int:
+        cutoff = datetime.now() - CACHE_TTL
         old_docs = db.collection("llm_cache").where(
             "created_at", "<", cutoff
         ).stream()
@@ -96,6 +296,10 @@ async def cleanup_old_cache(db: "firestore.Client") -> int:
                 batch = db.batch()
         
         batch.commit()
+        return count
+
+    try:
+        count = await run_firestore_job(delete_old_docs)
         logger.info(f"Cleaned up {count} old cache entries")
         return count
     except Exception as e:
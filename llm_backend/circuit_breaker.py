@@ -0,0 +1,206 @@
+"""
+Circuit breakers for Groq, Qdrant and Firestore
+
+Each breaker watches a sliding window of recent calls to one dependency.
+When too many of them fail, or are too slow, it opens and further calls
+fail immediately (503) instead of waiting out timeouts and retries. After
+a cool-down it lets a probe call through (half-open); success closes the
+breaker again, failure re-opens it.
+
+The breakers wrap the call paths that use the clients from dependencies.py
+(call_llm_with_retry / stream_llm_with_retry, run_firestore, and the
+Qdrant calls), not the getters, so cached responses are still served while
+a dependency is down.
+"""
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from groq import RateLimitError
+import logging
+
+from llm_backend.exceptions import ServiceUnavailableError, LLMServiceError
+from llm_backend.prometheus import CIRCUIT_STATE, CIRCUIT_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one dependency
+
+    Args:
+        name: Dependency name (used in errors, logs and metrics)
+        failure_rate_threshold: Fraction of failed calls in the window that opens the breaker
+        slow_call_seconds: Calls slower than this count as slow
+        slow_rate_threshold: Fraction of slow calls in the window that opens the breaker
+        window: Number of recent calls considered
+        min_calls: Calls needed in the window before rates are evaluated
+        open_seconds: Cool-down before a half-open probe is allowed
+        half_open_probes: Concurrent probe calls allowed while half-open
+        ignored_errors: Exception types that don't count as failures
+        open_error: Factory for the exception raised when failing fast
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_rate_threshold: float = 0.8,
+        window: int = 20,
+        min_calls: int = 10,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_probes: int = 1,
+        ignored_errors: tuple = (),
+        open_error=None
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.ignored_errors = ignored_errors
+        self.open_error = open_error or (lambda: ServiceUnavailableError(name))
+        self._calls = deque(maxlen=window)  # (failed, slow)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.times_opened = 0
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker '{self.name}': {self._state} -> {state}")
+        self._state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == HALF_OPEN:
+            self._probes = 0
+        else:
+            self._calls.clear()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """Raise the open error if the call must fail fast"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            if self._state != CLOSED:
+                self.rejected += 1
+                CIRCUIT_REJECTIONS.labels(self.name).inc()
+                raise self.open_error()
+
+    def after_call(self, duration: float, error: BaseException = None):
+        """Record the outcome of a call admitted by before_call()"""
+        failed = error is not None and not isinstance(error, self.ignored_errors)
+        slow = duration >= self.slow_call_seconds
+
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(OPEN if failed or slow else CLOSED)
+                return
+            if self._state == OPEN:
+                return
+
+            self._calls.append((failed, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failure_rate = sum(1 for f, _ in self._calls if f) / len(self._calls)
+            slow_rate = sum(1 for _, s in self._calls if s) / len(self._calls)
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_rate_threshold:
+                self._transition(OPEN)
+
+    def _abandon(self):
+        """A call was cancelled before finishing; free its probe slot"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    @contextmanager
+    def guard(self):
+        """
+        Fail fast while open, and record the guarded call's outcome
+
+        Guard only the dependency's own call, not work before it (e.g.
+        embedding the query), so other services' failures don't trip it.
+
+        Example:
+            vector = await embeddings.aembed_query(text)
+            with qdrant_breaker.guard():
+                response = await asyncio.to_thread(client.query_points, collection_name, query=vector)
+        """
+        self.before_call()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.after_call(time.perf_counter() - start, e)
+            raise
+        except BaseException:
+            self._abandon()
+            raise
+        else:
+            self.after_call(time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            calls = len(self._calls)
+            return {
+                "state": state,
+                "window_calls": calls,
+                "window_failures": sum(1 for f, _ in self._calls if f),
+                "window_slow": sum(1 for _, s in self._calls if s),
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+
+llm_breaker = CircuitBreaker(
+    "llm",
+    slow_call_seconds=float(os.getenv("LLM_SLOW_CALL_SECONDS", "30")),
+    # Quota pushback is handled by the rate governor, not a sign of an outage
+    ignored_errors=(RateLimitError,),
+    open_error=lambda: LLMServiceError("LLM circuit open")
+)
+qdrant_breaker = CircuitBreaker(
+    "qdrant",
+    slow_call_seconds=float(os.getenv("QDRANT_SLOW_CALL_SECONDS", "5"))
+)
+firestore_breaker = CircuitBreaker(
+    "firestore",
+    slow_call_seconds=float(os.getenv("FIRESTORE_SLOW_CALL_SECONDS", "5"))
+)
+
+BREAKERS = (llm_breaker, qdrant_breaker, firestore_breaker)
+
+
+def breaker_states() -> dict:
+    """Breaker stats by dependency name (for health checks)"""
+    return {breaker.name: breaker.stats() for breaker in BREAKERS}
@@ -4,12 +4,14 @@ FastAPI dependency injection functions
 from fastapi import HTTPException
 from firebase_admin import firestore
 from langchain_groq import ChatGroq
-from langchain_qdrant import Qdrant
 
 # Global state (populated during app startup)
 _db = None
 _llm = None
-_qdrant_db = None
+_candidate_index = None
+_semantic_cache = None
+_embedding_cache = None
+_metrics_writer = None
 
 
 def set_db(db: "firestore.Client"):
@@ -24,10 +26,28 @@ def set_llm(llm: ChatGroq):
     _llm = llm
 
 
-def set_qdrant(qdrant: Qdrant):
-    """Set the global Qdrant client"""
-    global _qdrant_db
-    _qdrant_db = qdrant
+def set_candidate_index(candidate_index):
+    """Set the global candidate vector index"""
+    global _candidate_index
+    _candidate_index = candidate_index
+
+
+def set_semantic_cache(semantic_cache):
+    """Set the global semantic cache (None when disabled)"""
+    global _semantic_cache
+    _semantic_cache = semantic_cache
+
+
+def set_embedding_cache(embedding_cache):
+    """Set the global embedding cache (None when embeddings are unavailable)"""
+    global _embedding_cache
+    _embedding_cache = embedding_cache
+
+
+def set_metrics_writer(metrics_writer):
+    """Set the global api_metrics writer"""
+    global _metrics_writer
+    _metrics_writer = metrics_writer
 
 
 def get_db() -> "firestore.Client":
@@ -44,8 +64,18 @@ def get_llm():
     return _llm
 
 
-def get_qdrant():
-    """Get Qdrant client dependency"""
-    if _qdrant_db is None:
+def get_candidate_index():
+    """Get candidate vector index dependency"""
+    if _candidate_index is None:
         raise HTTPException(status_code=503, detail="Vector database not available. Resume parsing and candidate ranking features are currently disabled. Please contact support.")
-    return _qdrant_db
\ No newline at end of file
+    return _candidate_index
+
+
+def get_semantic_cache():
+    """Get semantic cache dependency (None when disabled or unavailable)"""
+    return _semantic_cache
+
+
+def get_embedding_cache():
+    """Get embedding cache dependency (None when unavailable)"""
+    return _embedding_cache
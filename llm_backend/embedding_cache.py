@@ -0,0 +1,269 @@
+"""
+Content-addressed embedding cache
+
+Wraps the embeddings model so repeated texts (the same JD re-ranked, a
+resume re-ingested, semantic cache lookups) never reach the Voyage API.
+
+Two tiers, keyed by (model, kind, sha256(text)):
+- memory: bounded in-process LRU (per worker)
+- disk: local SQLite file (shared by the workers on one host, survives restarts)
+
+`kind` separates query and document embeddings, since Voyage embeds them
+with different input types. The cache sits in front of MeteredEmbeddings,
+so only real API calls are metered.
+"""
+import os
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+import logging
+
+from llm_backend.prometheus import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+QUERY = "query"
+DOCUMENT = "document"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def is_busy(e: sqlite3.Error) -> bool:
+    """Transient lock contention with another connection (SQLITE_BUSY / SQLITE_LOCKED)"""
+    code = getattr(e, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(e).lower()
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class EmbeddingStore:
+    """
+    Embedding vectors in a local SQLite file (float32 blobs)
+
+    Lock contention between workers ("database is locked/busy" after the
+    connection timeout) only turns that read into a miss or skips that
+    write. Any other error (corrupt file, I/O failure) disables the store
+    for the rest of the process rather than failing embedding calls; the
+    memory tier and the API keep working.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self.busy_errors = 0
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+            # WAL lets several workers read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, kind TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, kind, text_hash))"
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Embedding cache store unavailable at {path}: {e}")
+            self._conn = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def _handle_error(self, e: sqlite3.Error, operation: str):
+        if is_busy(e):
+            self.busy_errors += 1
+            logger.warning(f"Embedding cache store busy, skipping {operation}: {e}")
+            return
+        logger.error(f"Disabling embedding cache store after error: {e}")
+        self._conn = None
+
+    def get_many(self, model: str, kind: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Vectors found on disk, by text hash"""
+        if not self._conn or not hashes:
+            return {}
+        found = {}
+        with self._lock:
+            try:
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(hashes), 500):
+                    chunk = hashes[start:start + 500]
+                    rows = self._conn.execute(
+                        "SELECT text_hash, vector FROM embeddings WHERE model = ? AND kind = ? "
+                        f"AND text_hash IN ({', '.join('?' * len(chunk))})",
+                        (model, kind, *chunk)
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = array("f", blob).tolist()
+            except sqlite3.Error as e:
+                self._handle_error(e, "read")
+        return found
+
+    def put_many(self, model: str, kind: str, vectors: Dict[str, List[float]]):
+        if not self._conn or not vectors:
+            return
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, kind, text_hash, vector) VALUES (?, ?, ?, ?)",
+                    [(model, kind, key, array("f", vector).tobytes()) for key, vector in vectors.items()]
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._handle_error(e, "write")
+                if self._conn:
+                    # Don't leave a half-started transaction holding the lock
+                    with suppress(sqlite3.Error):
+                        self._conn.rollback()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper serving repeated texts from memory or disk
+
+    Args:
+        embeddings: Underlying (metered) embeddings model
+        model: Embedding model name, part of the cache key
+        store: Disk tier (None for memory only)
+        max_entries: Memory tier size (vectors)
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        store: Optional[EmbeddingStore] = None,
+        max_entries: int = 4096
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.store = store
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # (kind, text_hash) -> vector
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, kind: str, vectors: Dict[str, List[float]]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._memory[(kind, key)] = vector
+                self._memory.move_to_end((kind, key))
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup_memory(self, kind: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in hashes:
+                vector = self._memory.get((kind, key))
+                if vector is not None:
+                    self._memory.move_to_end((kind, key))
+                    found[key] = vector
+        return found
+
+    def _record(self, memory: int, disk: int, missed: int):
+        with self._lock:
+            self.memory_hits += memory
+            self.disk_hits += disk
+            self.misses += missed
+        record_cache_lookup("embedding_memory", True, memory)
+        record_cache_lookup("embedding_memory", False, disk + missed)
+        if self.store:
+            record_cache_lookup("embedding_disk", True, disk)
+            record_cache_lookup("embedding_disk", False, missed)
+
+    def _resolve(self, kind: str, texts: List[str], embed) -> List[List[float]]:
+        """Shared lookup path for the sync methods; embed(missing_texts) calls the API"""
+        hashes = [text_hash(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+
+        found = self._lookup_memory(kind, unique)
+        memory_hits = len(found)
+        missing = [key for key in unique if key not in found]
+        from_disk = self.store.get_many(self.model, kind, missing) if self.store else {}
+        found.update(from_disk)
+        self._remember(kind, from_disk)
+
+        missing = [key for key in missing if key not in found]
+        if missing:
+            text_by_hash = dict(zip(hashes, texts))
+            fresh = dict(zip(missing, embed([text_by_hash[key] for key in missing])))
+            found.update(fresh)
+            self._remember(kind, fresh)
+            if self.store:
+                self.store.put_many(self.model, kind, fresh)
+
+        self._record(memory_hits, len(from_disk), len(missing))
+        return [found[key] for key in hashes]
+
+    async def _aresolve(self, kind: str, texts: List[str], aembed) -> List[List[float]]:
+        """Async lookup path; disk I/O runs in a worker thread"""
+        hashes = [text_hash(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+
+        found = self._lookup_memory(kind, unique)
+        memory_hits = len(found)
+        missing = [key for key in unique if key not in found]
+        from_disk = {}
+        if self.store and missing:
+            from_disk = await asyncio.to_thread(self.store.get_many, self.model, kind, missing)
+        found.update(from_disk)
+        self._remember(kind, from_disk)
+
+        missing = [key for key in missing if key not in found]
+        if missing:
+            text_by_hash = dict(zip(hashes, texts))
+            fresh = dict(zip(missing, await aembed([text_by_hash[key] for key in missing])))
+            found.update(fresh)
+            self._remember(kind, fresh)
+            if self.store:
+                await asyncio.to_thread(self.store.put_many, self.model, kind, fresh)
+
+        self._record(memory_hits, len(from_disk), len(missing))
+        return [found[key] for key in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._resolve(DOCUMENT, texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._resolve(QUERY, [text], lambda missing: [self.embeddings.embed_query(missing[0])])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._aresolve(DOCUMENT, texts, self.embeddings.aembed_documents)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async def aembed(missing):
+            return [await self.embeddings.aembed_query(missing[0])]
+        return (await self._aresolve(QUERY, [text], aembed))[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            stats = {
+                "model": self.model,
+                "memory_entries": len(self._memory),
+                "memory_max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": f"{(hits / lookups * 100) if lookups else 0:.1f}%",
+            }
+        stats["disk_enabled"] = bool(self.store and self.store.enabled)
+        stats["disk_busy_errors"] = self.store.busy_errors if self.store else 0
+        return stats
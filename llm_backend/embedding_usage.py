@@ -0,0 +1,264 @@
+"""
+Embedding token accounting
+
+Every call that actually reaches the Voyage embedding API is metered by
+wrapping the embeddings model. Token counts are accumulated in Firestore
+counters (embedding_usage/totals plus one doc per UTC day with per-user
+and per-operation breakdowns), so usage stats are an O(1) read.
+
+Calls only add to in-memory deltas; MetricsWriter commits them on its
+rollup interval, so embedding calls never wait on Firestore and the shared
+counter docs get one write per worker per interval.
+
+Two counts are recorded per call:
+- tokens: counted with Voyage's own tokenizer for the model (what the API bills)
+- estimated_tokens: a local ~4 chars/token heuristic, always available
+
+If the Voyage tokenizer fails, `tokens` falls back to the estimate until
+the tokenizer is retried after a backoff.
+"""
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from firebase_admin import firestore
+from langchain_core.embeddings import Embeddings
+import logging
+
+from llm_backend.firestore_io import run_firestore
+from llm_backend.prometheus import observe_dependency
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_USAGE_COLLECTION = "embedding_usage"
+
+# Seconds before retrying a failed tokenizer; doubles per consecutive failure
+TOKENIZER_RETRY_SECONDS = 30
+TOKENIZER_MAX_RETRY_SECONDS = 3600
+
+# (user_uid, operation) for embedding calls made inside the current request
+_embedding_context = contextvars.ContextVar("embedding_context", default=(None, "unknown"))
+
+
+@contextmanager
+def embedding_context(user_uid: str, operation: str):
+    """Attribute embedding calls made inside this block to a user and operation"""
+    token = _embedding_context.set((user_uid, operation))
+    try:
+        yield
+    finally:
+        _embedding_context.reset(token)
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    """Cheap local estimate (~4 characters per token)"""
+    return sum(max(1, len(text) // 4) for text in texts)
+
+
+class EmbeddingUsageTracker:
+    """
+    Counts embedded tokens into pending Firestore counter deltas
+
+    Drained by MetricsWriter like RollupAggregator: drain() / to_payload()
+    / restore().
+
+    Args:
+        db: Firestore client (None: nothing is recorded)
+        model: Voyage model name, used to select the tokenizer
+    """
+
+    def __init__(self, db, model: str):
+        self.db = db
+        self.model = model
+        self._client = None
+        self._tokenizer_failures = 0
+        self._tokenizer_retry_at = 0.0
+        self._lock = threading.Lock()
+        self._pending = {}  # doc_id -> counts
+        self._pending_lock = threading.Lock()
+
+    def count_tokens(self, texts: List[str]) -> tuple:
+        """
+        Returns:
+            Tuple of (tokens, estimated_tokens)
+        """
+        estimated = estimate_tokens(texts)
+        if time.monotonic() < self._tokenizer_retry_at:
+            return estimated, estimated
+
+        try:
+            with self._lock:
+                if self._client is None:
+                    import voyageai
+                    self._client = voyageai.Client(api_key=os.getenv("VOYAGEAI_API_KEY"))
+            tokens = self._client.count_tokens(texts, model=self.model)
+        except Exception as e:
+            # Often transient (e.g. the tokenizer download failing), so back off instead of giving up
+            with self._lock:
+                self._tokenizer_failures += 1
+                backoff = min(
+                    TOKENIZER_RETRY_SECONDS * 2 ** (self._tokenizer_failures - 1),
+                    TOKENIZER_MAX_RETRY_SECONDS
+                )
+                self._tokenizer_retry_at = time.monotonic() + backoff
+            logger.warning(f"Voyage tokenizer unavailable, using estimates for {backoff}s: {e}")
+            return estimated, estimated
+
+        self._tokenizer_failures = 0
+        return tokens, estimated
+
+    def _add(self, texts: List[str], tokens: int, estimated: int, user_uid: Optional[str], operation: str):
+        now = datetime.now(timezone.utc)
+        with self._pending_lock:
+            for doc_id in ("totals", f"day_{now:%Y-%m-%d}"):
+                counts = self._pending.get(doc_id)
+                if counts is None:
+                    counts = {"tokens": 0, "estimated_tokens": 0, "calls": 0, "texts": 0, "operations": {}, "users": {}}
+                    if doc_id != "totals":
+                        counts["date"] = now.strftime("%Y-%m-%d")
+                    self._pending[doc_id] = counts
+                self._merge(counts, {
+                    "tokens": tokens,
+                    "estimated_tokens": estimated,
+                    "calls": 1,
+                    "texts": len(texts),
+                    "operations": {operation: {"tokens": tokens, "calls": 1, "texts": len(texts)}},
+                    # Per-user breakdown is kept on day docs only
+                    "users": {user_uid: {"tokens": tokens, "calls": 1}} if user_uid and doc_id != "totals" else {},
+                })
+        logger.debug(f"Embedded {len(texts)} texts ({tokens} tokens) for {operation}")
+
+    @staticmethod
+    def _merge(counts: dict, delta: dict):
+        for key in ("tokens", "estimated_tokens", "calls", "texts"):
+            counts[key] += delta[key]
+        for group in ("operations", "users"):
+            for name, values in delta[group].items():
+                target = counts[group].setdefault(name, {})
+                for key, value in values.items():
+                    target[key] = target.get(key, 0) + value
+
+    def record(self, texts: List[str]):
+        """Record an embedding call (blocking: counts tokens; for use from worker threads)"""
+        if not self.db:
+            return
+        user_uid, operation = _embedding_context.get()
+        self._add(texts, *self.count_tokens(texts), user_uid, operation)
+
+    async def arecord(self, texts: List[str]):
+        """Record an embedding call, counting tokens off the event loop"""
+        if not self.db:
+            return
+        user_uid, operation = _embedding_context.get()
+        tokens, estimated = await asyncio.to_thread(self.count_tokens, texts)
+        self._add(texts, tokens, estimated, user_uid, operation)
+
+    def drain(self) -> list:
+        """Take all pending deltas as (doc_id, counts) tuples"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        return list(pending.items())
+
+    def restore(self, drained: list):
+        """Fold drained deltas back in (their write failed), to retry on the next flush"""
+        with self._pending_lock:
+            for doc_id, delta in drained:
+                counts = self._pending.get(doc_id)
+                if counts is None:
+                    self._pending[doc_id] = delta
+                else:
+                    self._merge(counts, delta)
+
+    def to_payload(self, counts: dict) -> dict:
+        """Firestore merge payload (Increment transforms) for drained counts"""
+        def increments(values: dict) -> dict:
+            return {key: firestore.Increment(value) for key, value in values.items()}
+
+        payload = {
+            **increments({key: counts[key] for key in ("tokens", "estimated_tokens", "calls", "texts")}),
+            "operations": {name: increments(values) for name, values in counts["operations"].items()},
+            "model": self.model,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        }
+        if "date" in counts:
+            payload["date"] = counts["date"]
+        if counts["users"]:
+            payload["users"] = {uid: increments(values) for uid, values in counts["users"].items()}
+        return payload
+
+
+class MeteredEmbeddings(Embeddings):
+    """Embeddings wrapper that records token usage for every underlying API call"""
+
+    def __init__(self, embeddings: Embeddings, tracker: EmbeddingUsageTracker):
+        self.embeddings = embeddings
+        self.tracker = tracker
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with observe_dependency("voyage", "embed_documents"):
+            vectors = self.embeddings.embed_documents(texts)
+        self.tracker.record(texts)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with observe_dependency("voyage", "embed_query"):
+            vector = self.embeddings.embed_query(text)
+        self.tracker.record([text])
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with observe_dependency("voyage", "embed_documents"):
+            vectors = await self.embeddings.aembed_documents(texts)
+        await self.tracker.arecord(texts)
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with observe_dependency("voyage", "embed_query"):
+            vector = await self.embeddings.aembed_query(text)
+        await self.tracker.arecord([text])
+        return vector
+
+
+async def get_embedding_usage(db: "firestore.Client", days: int = 0, user_uid: Optional[str] = None) -> dict:
+    """
+    Read embedding usage counters
+
+    Args:
+        db: Firestore client
+        days: If > 0, include a per-day breakdown for the last N days
+        user_uid: If set, include this user's totals over those days
+
+    Returns:
+        {"totals": {...}, "daily": [...]} (daily only when days > 0)
+    """
+    collection = db.collection(EMBEDDING_USAGE_COLLECTION)
+    totals_doc = await run_firestore(collection.document("totals").get)
+    usage = {"totals": totals_doc.to_dict() if totals_doc.exists else {}}
+
+    if days > 0:
+        today = datetime.now(timezone.utc).date().toordinal()
+        dates = [datetime.fromordinal(today - i).strftime("%Y-%m-%d") for i in range(days)]
+        refs = [collection.document(f"day_{date}") for date in dates]
+        docs = await run_firestore(lambda: list(db.get_all(refs)))
+        by_date = {doc.id: doc.to_dict() for doc in docs if doc.exists}
+
+        daily = []
+        for date in dates:
+            day = by_date.get(f"day_{date}", {})
+            entry = {
+                "date": date,
+                "tokens": day.get("tokens", 0),
+                "estimated_tokens": day.get("estimated_tokens", 0),
+                "calls": day.get("calls", 0),
+            }
+            if user_uid:
+                entry["user"] = day.get("users", {}).get(user_uid, {"tokens": 0, "calls": 0})
+            daily.append(entry)
+        usage["daily"] = daily
+
+    return usage
@@ -37,11 +37,23 @@ class InvalidInputError(ScoutIQException):
         )
 
 
+class ServiceUnavailableError(ScoutIQException):
+    """Raised when a dependency's circuit breaker is open"""
+    def __init__(self, dependency: str):
+        self.dependency = dependency
+        super().__init__(
+            message=f"{dependency} circuit open",
+            status_code=503,
+            user_message="This feature is temporarily unavailable. Please try again shortly."
+        )
+
+
 def get_error_suggestion(exc: ScoutIQException) -> str:
     """Provide helpful suggestions based on error type"""
     suggestions = {
         LLMServiceError: "Our AI is temporarily overloaded. Please wait 30 seconds and try again.",
         RateLimitError: "You've reached the rate limit. Wait a minute before making more requests.",
         InvalidInputError: "Double-check that your Job Description and Resume contain valid text.",
+        ServiceUnavailableError: "A service we depend on is recovering. Please try again in a minute.",
     }
     return suggestions.get(type(exc), "Please try again or contact support if the issue persists.")
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Non-blocking Firestore access for async handlers
+
+The firebase_admin Firestore client is synchronous; calling it directly
+inside an `async def` blocks the event loop for the whole round trip.
+All backend Firestore calls go through run_firestore(), which runs them
+on a dedicated, bounded thread pool so concurrent requests overlap their
+I/O instead of serializing on the loop. Long maintenance jobs (purges,
+cleanups) use run_firestore_job() instead, which skips the circuit breaker.
+"""
+import os
+import json
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+import logging
+
+from llm_backend.prometheus import observe_dependency
+from llm_backend.circuit_breaker import firestore_breaker
+
+logger = logging.getLogger(__name__)
+
+FIRESTORE_MAX_WORKERS = int(os.getenv("FIRESTORE_MAX_WORKERS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=FIRESTORE_MAX_WORKERS, thread_name_prefix="firestore")
+
+
+async def run_firestore(func, *args, **kwargs):
+    """
+    Run a blocking Firestore call on the Firestore thread pool
+
+    Args:
+        func: Blocking callable (e.g. doc_ref.get, batch.commit, or a lambda
+              that iterates a query stream)
+        *args, **kwargs: Passed through to func
+
+    Returns:
+        Whatever func returns
+
+    Raises:
+        ServiceUnavailableError: If the Firestore circuit breaker is open
+    """
+    loop = asyncio.get_running_loop()
+    operation = getattr(func, "__name__", "call").strip("_<>")
+
+    def call():
+        # Timed on the worker so pool queueing isn't counted as Firestore latency
+        with observe_dependency("firestore", operation):
+            return func(*args, **kwargs)
+
+    # Carry context vars (request-scoped state) into the worker thread
+    ctx = contextvars.copy_context()
+    with firestore_breaker.guard():
+        return await loop.run_in_executor(_executor, ctx.run, call)
+
+
+async def run_firestore_job(func, *args, **kwargs):
+    """
+    Run a long Firestore job (purge, cleanup) on the Firestore thread pool
+
+    Not guarded by the circuit breaker or timed as a Firestore call: a job
+    taking minutes says nothing about Firestore health, and counting it
+    would open the breaker for every other request.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, ctx.run, lambda: func(*args, **kwargs))
+
+
+async def stream_to_dicts(query) -> list:
+    """Materialize a query's documents as dicts without blocking the loop"""
+    return await run_firestore(lambda: [doc.to_dict() for doc in query.stream()])
+
+
+def _ordered(collection_ref, order_by: str, descending: bool):
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+    field = FieldPath.document_id() if order_by == "__name__" else order_by
+    query = collection_ref.order_by(field, direction=direction)
+    if order_by != "__name__":
+        # Tie-break on document id so pages are stable when values repeat
+        query = query.order_by(FieldPath.document_id(), direction=direction)
+    return query
+
+
+async def fetch_page(
+    collection_ref,
+    limit: int,
+    start_after: str = None,
+    order_by: str = "__name__",
+    descending: bool = False
+) -> dict:
+    """
+    Fetch one page of a collection with server-side ordering and a cursor
+
+    Args:
+        collection_ref: Firestore collection reference
+        limit: Page size
+        start_after: Document id of the last item of the previous page
+        order_by: Field to order by ("__name__" for document id)
+        descending: Sort direction
+
+    Returns:
+        {"items": [...], "next_cursor": doc id or None}; each item includes its "id"
+    """
+    query = _ordered(collection_ref, order_by, descending)
+    if start_after:
+        cursor = await run_firestore(collection_ref.document(start_after).get)
+        # Raised outside run_firestore: a bad cursor is a client error, not a Firestore failure
+        if not cursor.exists:
+            raise ValueError(f"Unknown cursor: {start_after}")
+        query = query.start_after(cursor)
+
+    def load() -> dict:
+        docs = list(query.limit(limit).stream())
+        return {
+            "items": [{"id": doc.id, **doc.to_dict()} for doc in docs],
+            "next_cursor": docs[-1].id if len(docs) == limit else None,
+        }
+
+    return await run_firestore(load)
+
+
+async def stream_ndjson(collection_ref, order_by: str = "__name__", descending: bool = False, page_size: int = 500):
+    """
+    Export a whole collection as NDJSON lines, one page in memory at a time
+
+    Yields:
+        One JSON line per document (with its "id")
+    """
+    query = _ordered(collection_ref, order_by, descending)
+    last = None
+
+    while True:
+        page_query = query.start_after(last) if last is not None else query
+        docs = await run_firestore(lambda: list(page_query.limit(page_size).stream()))
+        for doc in docs:
+            yield json.dumps({"id": doc.id, **doc.to_dict()}, default=str) + "\n"
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def shutdown_executor():
+    """Stop accepting new Firestore work and let running calls finish"""
+    _executor.shutdown(wait=True)
+    logger.info("Firestore executor shut down.")
@@ -4,22 +4,25 @@ Main FastAPI application with routes for interview question generation,
 resume parsing, candidate ranking, and analytics.
 """
 import os
+import json
+import asyncio
+import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import logging
 
 import firebase_admin
 from firebase_admin import firestore, credentials
-from fastapi import FastAPI, Request, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from typing import Optional
+from fastapi import FastAPI, Request, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.exceptions import RequestValidationError
 from dotenv import load_dotenv
 
 from langchain_groq import ChatGroq
-from langchain_qdrant import Qdrant
+from groq import RateLimitError as GroqRateLimitError
 from langchain_community.embeddings import VoyageEmbeddings
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
 from langchain_core.documents import Document
 
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -27,20 +30,47 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 # Local imports
-from llm_backend.models import ParsedResume, Input, ResumeInput, JDInput, FeedbackInput
-from llm_backend.prompts import free_tier_prompt, pro_tier_prompt, parse_resume_prompt, job_seeker_prompt
-from llm_backend.security import get_current_user, get_admin_user
+from llm_backend.models import (
+    ParsedResume, Input, ResumeInput, ResumeBatchInput, JDInput, FeedbackInput, BatchInput
+)
+from llm_backend.prompts import (
+    free_tier_prompt, pro_tier_prompt, parse_resume_prompt, job_seeker_prompt,
+    FREE_TIER_OUTPUT_TOKENS, PRO_TIER_OUTPUT_TOKENS, PARSE_RESUME_OUTPUT_TOKENS, JOB_SEEKER_OUTPUT_TOKENS
+)
+from llm_backend.security import (
+    get_current_user, get_admin_user, refresh_certificates_periodically, token_cache
+)
 from llm_backend.exceptions import (
     ScoutIQException, LLMServiceError, RateLimitError, InvalidInputError,
-    get_error_suggestion
+    ServiceUnavailableError, get_error_suggestion
 )
 from llm_backend.cache import (
-    generate_cache_key, get_cached_response, cache_response, cleanup_old_cache
+    generate_cache_key, get_cached_response, cache_response, cleanup_old_cache,
+    get_cache_stats, get_inflight_stats, single_flight, resume_content_hash
 )
 from llm_backend.middleware import track_request_middleware
 from llm_backend.analytics import track_feature_usage
 from llm_backend import dependencies
-from llm_backend.utils import call_llm_with_retry, parse_pro_response, extract_section
+from llm_backend.firestore_io import (
+    run_firestore, stream_to_dicts, shutdown_executor, fetch_page, stream_ndjson
+)
+from llm_backend.semantic_cache import SemanticCache
+from llm_backend.embedding_usage import (
+    EmbeddingUsageTracker, MeteredEmbeddings, embedding_context, get_embedding_usage
+)
+from llm_backend.embedding_cache import CachedEmbeddings, EmbeddingStore
+from llm_backend.vector_store import CandidateIndex
+from llm_backend.metrics_writer import create_metrics_writer
+from llm_backend.rollups import rollup_aggregator, read_rollups, purge_raw_analytics, histogram_quantile
+from llm_backend.prometheus import record_cache_lookup, render_metrics
+from llm_backend.timing import span
+from llm_backend.rate_governor import groq_governor
+from llm_backend.circuit_breaker import breaker_states, OPEN
+from llm_backend.tiers import get_user_tier, start_invalidation_listener, tier_cache
+from llm_backend.utils import (
+    call_llm_with_retry, stream_llm_with_retry, parse_pro_response, extract_section,
+    StreamingSectionParser, llm_scheduler, llm_hedger
+)
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -49,6 +79,14 @@ logger = logging.getLogger(__name__)
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
+GENERATE_BATCH_MAX = int(os.getenv("GENERATE_BATCH_MAX", "10"))
+PARSE_BATCH_MAX = int(os.getenv("PARSE_BATCH_MAX", "50"))
+EMBEDDING_MODEL = "voyage-3.5-lite"
+# Texts per Voyage embed call / points per Qdrant upsert (voyage-3.5-lite accepts up to 1000)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+# Firestore caps a WriteBatch at 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -66,21 +104,62 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Firebase initialization failed: {e}")
 
+    cert_refresher = asyncio.create_task(refresh_certificates_periodically())
+    tier_watch = start_invalidation_listener(dependencies._db) if dependencies._db else None
+
+    # Usage deltas are committed by the metrics writer
+    embedding_usage = EmbeddingUsageTracker(dependencies._db, EMBEDDING_MODEL)
+
+    if dependencies._db:
+        metrics_writer = create_metrics_writer(
+            dependencies._db, rollups=rollup_aggregator, embedding_usage=embedding_usage
+        )
+        metrics_writer.start()
+        dependencies.set_metrics_writer(metrics_writer)
+
     # Initialize LLM
     try:
-        llm = ChatGroq(model="llama-3.3-70b-versatile")
+        # Clients report x-ratelimit-* headers back to the rate governor
+        http_client, http_async_client = groq_governor.http_clients()
+        llm = ChatGroq(
+            model="llama-3.3-70b-versatile",
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
         dependencies.set_llm(llm)
         logger.info("Groq LLM initialized.")
+
+        fallback_model = os.getenv("LLM_HEDGE_FALLBACK_MODEL")
+        if llm_hedger.enabled and fallback_model:
+            llm_hedger.fallback_llm = ChatGroq(
+                model=fallback_model,
+                http_client=http_client,
+                http_async_client=http_async_client
+            )
+            logger.info(f"LLM hedging enabled (fallback model: {fallback_model}).")
     except Exception as e:
         logger.error(f"LLM initialization failed: {e}")
 
     # Initialize Embeddings & Qdrant
     try:
         logger.info("Loading Voyage AI embedding model...")
-        embeddings_model = VoyageEmbeddings(
-            model="voyage-3.5-lite",
-            voyage_api_key=os.getenv("VOYAGEAI_API_KEY")
+        metered_embeddings = MeteredEmbeddings(
+            VoyageEmbeddings(
+                model=EMBEDDING_MODEL,
+                voyage_api_key=os.getenv("VOYAGEAI_API_KEY"),
+                batch_size=EMBEDDING_BATCH_SIZE
+            ),
+            embedding_usage
+        )
+        # Repeated texts are served locally and never metered
+        cache_path = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+        embeddings_model = CachedEmbeddings(
+            metered_embeddings,
+            model=EMBEDDING_MODEL,
+            store=EmbeddingStore(cache_path) if cache_path else None,
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
         )
+        dependencies.set_embedding_cache(embeddings_model)
         logger.info("Embedding model loaded.")
 
         logger.info("Connecting to Qdrant...")
@@ -94,37 +173,45 @@ async def lifespan(app: FastAPI):
         qdrant_client = QdrantClient(
             url=qdrant_url,
             api_key=qdrant_api_key,
-            timeout=60
+            timeout=int(os.getenv("QDRANT_TIMEOUT", "10"))
         )
 
-        collection_name = "scoutiq_resumes_v2"
-        try:
-            qdrant_client.get_collection(collection_name)
-            logger.info(f"Collection '{collection_name}' exists.")
-        except Exception:
-            logger.info(f"Creating collection '{collection_name}'...")
-            qdrant_client.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(size=512, distance=Distance.COSINE)
-            )
-            logger.info(f"Collection created.")
-
-        qdrant_db = Qdrant(
-            client=qdrant_client,
-            collection_name=collection_name,
-            embeddings=embeddings_model,
+        candidate_index = CandidateIndex(
+            qdrant_client,
+            embeddings_model,
+            hybrid=os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
         )
-        dependencies.set_qdrant(qdrant_db)
+        candidate_index.ensure_collection()
+        dependencies.set_candidate_index(candidate_index)
         logger.info("Qdrant client initialized.")
+
+        if os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true":
+            try:
+                semantic_cache = SemanticCache(
+                    client=qdrant_client,
+                    embeddings=embeddings_model,
+                    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+                )
+                semantic_cache.ensure_collection()
+                dependencies.set_semantic_cache(semantic_cache)
+                logger.info(f"Semantic cache enabled (threshold: {semantic_cache.threshold}).")
+            except Exception as e:
+                logger.error(f"Semantic cache initialization failed: {e}")
     except Exception as e:
         logger.error(f"❌ Qdrant/Embeddings initialization failed: {e}")
         logger.warning("⚠️ Resume parsing and candidate ranking features will be unavailable.")
         # Don't crash - let the API start without Qdrant
-        dependencies.set_qdrant(None)
+        dependencies.set_candidate_index(None)
 
     logger.info("Startup complete. Server is ready.")
     yield
     logger.info("Shutting down...")
+    cert_refresher.cancel()
+    if tier_watch:
+        tier_watch.unsubscribe()
+    if dependencies._metrics_writer:
+        await dependencies._metrics_writer.stop()
+    shutdown_executor()
 
 
 # Initialize FastAPI app
@@ -190,8 +277,7 @@ async def general_exception_handler(request: Request, exc: Exception):
 @app.middleware("http")
 async def track_requests(request: Request, call_next):
     """Track all requests for monitoring"""
-    db = dependencies.get_db() if dependencies._db else None
-    return await track_request_middleware(request, call_next, db)
+    return await track_request_middleware(request, call_next, dependencies._metrics_writer)
 
 
 # ============================================================================
@@ -200,14 +286,168 @@ async def track_requests(request: Request, call_next):
 
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Health check endpoint (includes circuit breaker state per dependency)"""
+    breakers = breaker_states()
     return {
-        "status": "healthy",
+        "status": "degraded" if any(b["state"] == OPEN for b in breakers.values()) else "healthy",
         "service": "ScoutIQ API",
-        "version": "2.0.0"
+        "version": "2.0.0",
+        "dependencies": breakers
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Prometheus scrape endpoint (aggregated across gunicorn workers)
+
+    If METRICS_TOKEN is set, scrapers must send it as a Bearer token.
+    """
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+def validate_generate_input(data: Input):
+    """Reject JD/resume pairs too short to produce useful questions"""
+    if len(data.jd.strip()) < 50:
+        raise InvalidInputError("Job Description", "Must be at least 50 characters long")
+    if len(data.resume.strip()) < 100:
+        raise InvalidInputError("Resume", "Must be at least 100 characters long")
+
+
+def has_technical_questions(response) -> bool:
+    """A generation is usable if at least the technical questions parse"""
+    return bool(extract_section(response.content, "technical"))
+
+
+def build_result(text: str, is_pro: bool) -> dict:
+    """Parse raw LLM output into the /generate result shape for the tier"""
+    return parse_pro_response(text) if is_pro else {
+        "technical": extract_section(text, "technical"),
+        "behavioral": extract_section(text, "behavioral"),
+        "followup": extract_section(text, "followup"),
+        "insight_summary": None,
+        "skill_gaps": None
+    }
+
+
+async def generate_result(
+    llm: ChatGroq,
+    jd: str,
+    resume: str,
+    is_pro: bool,
+    tier: str,
+    user_uid: str,
+    interactive: bool = True
+) -> dict:
+    """Run the tier's prompt through the LLM and parse the response"""
+    prompt = pro_tier_prompt(jd, resume) if is_pro else free_tier_prompt(jd, resume)
+    output_tokens = PRO_TIER_OUTPUT_TOKENS if is_pro else FREE_TIER_OUTPUT_TOKENS
+    with span("llm"):
+        # Hedged when LLM_HEDGE_ENABLED: a slow or unparseable primary gets a backup request
+        response = await llm_hedger.call(
+            llm, prompt, validate=has_technical_questions,
+            tier=tier, user=user_uid, output_tokens=output_tokens, interactive=interactive
+        )
+
+    with span("parse"):
+        return build_result(response.content, is_pro)
+
+
+async def stream_result(
+    llm: ChatGroq,
+    jd: str,
+    resume: str,
+    is_pro: bool,
+    tier: str,
+    user_uid: str,
+    events: asyncio.Queue
+) -> dict:
+    """
+    Streaming counterpart of generate_result
+
+    Question and insight events go onto `events` as soon as their lines
+    parse. Streams are not hedged: a backup would have to replace output
+    that was already sent.
+    """
+    prompt = pro_tier_prompt(jd, resume) if is_pro else free_tier_prompt(jd, resume)
+    output_tokens = PRO_TIER_OUTPUT_TOKENS if is_pro else FREE_TIER_OUTPUT_TOKENS
+    parser = StreamingSectionParser()
+    chunks = []
+
+    stream = stream_llm_with_retry(llm, prompt, tier=tier, user=user_uid, output_tokens=output_tokens)
+    try:
+        async for chunk in stream:
+            chunks.append(chunk)
+            for event in parser.feed(chunk):
+                events.put_nowait(event)
+    finally:
+        await stream.aclose()
+    for event in parser.finish():
+        events.put_nowait(event)
+
+    return build_result("".join(chunks), is_pro)
+
+
+def result_events(result: dict) -> list:
+    """Streaming events for an already generated result (cache hits, coalesced requests)"""
+    events = []
+    for section in ("technical", "behavioral", "followup"):
+        for question in result.get(section) or []:
+            events.append({"event": "question", "section": section, "text": question})
+    for section in ("insight_summary", "skill_gaps"):
+        if result.get(section):
+            events.append({"event": section, "text": result[section]})
+    return events
+
+
+async def find_semantic_hit(semantic_cache: Optional[SemanticCache], data: Input, tier: str, user_uid: str):
+    """
+    Embed the inputs and look up a near-duplicate result of this user
+
+    Returns:
+        Tuple of (vector, hit): vector is None when the semantic cache is
+        off or failed, hit is (result, similarity) or None
+    """
+    if not semantic_cache:
+        return None, None
+    try:
+        with span("semantic_cache"), embedding_context(user_uid, "semantic_cache"):
+            vector = await semantic_cache.embed(data.jd, data.resume)
+            return vector, await semantic_cache.lookup(vector, tier, user_uid)
+    except Exception as e:
+        logger.error(f"Semantic cache unavailable: {e}")
+        return None, None
+
+
+def ndjson(event: dict) -> str:
+    """Serialize one streaming event as a newline-delimited JSON line"""
+    return json.dumps(event) + "\n"
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes its generator when the response ends
+
+    Starlette stops iterating on client disconnect but leaves the generator
+    suspended until it is garbage collected, along with whatever it holds
+    (LLM scheduler slots, in-flight tasks). Closing it runs its finally
+    blocks right away.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose:
+                await aclose()
+
+
 @app.post("/generate")
 @limiter.limit("10/minute")
 async def generate_questions(
@@ -215,112 +455,296 @@ async def generate_questions(
     data: Input,
     user: dict = Depends(get_current_user),
     llm: ChatGroq = Depends(dependencies.get_llm),
-    db: firestore.Client = Depends(dependencies.get_db)
+    db: firestore.Client = Depends(dependencies.get_db),
+    semantic_cache: SemanticCache = Depends(dependencies.get_semantic_cache)
 ):
     """
     Generate interview questions (and insights for Pro users)
     
     - Free users: Technical, behavioral, and followup questions
     - Pro users: All questions + insight summary + skill gaps
-    """
-    # Validate input
-    if len(data.jd.strip()) < 50:
-        raise InvalidInputError("Job Description", "Must be at least 50 characters long")
-    if len(data.resume.strip()) < 100:
-        raise InvalidInputError("Resume", "Must be at least 100 characters long")
 
-    # Check user tier
-    try:
-        doc_ref = db.collection("pro_users").document(user["email"].lower())
-        doc = doc_ref.get()
-        is_pro = doc.exists and doc.to_dict().get("tier") in ["monthly", "yearly", "lifetime"]
-        tier = doc.to_dict().get("tier", "free") if doc.exists else "free"
-    except Exception as e:
-        logger.error(f"Failed to check user tier: {e}")
-        is_pro = False
-        tier = "free"
+    Stage timings are returned in the Server-Timing header.
+    """
+    validate_generate_input(data)
+    with span("tier"):
+        is_pro, tier = await get_user_tier(user["email"], db)
 
     # Check cache
     cache_key = generate_cache_key(data.jd, data.resume, tier)
-    cached_result = await get_cached_response(cache_key, db)
+    with span("cache_read"):
+        cached_result = await get_cached_response(cache_key, db)
 
     if cached_result:
         return {"result": cached_result, "tier": tier, "cached": True}
 
-    # Generate new response
-    try:
-        prompt = pro_tier_prompt(data.jd, data.resume) if is_pro else free_tier_prompt(data.jd, data.resume)
-        response = await call_llm_with_retry(llm, prompt)
-        text = response.content
-
-        result = parse_pro_response(text) if is_pro else {
-            "technical": extract_section(text, "technical"),
-            "behavioral": extract_section(text, "behavioral"),
-            "followup": extract_section(text, "followup"),
-            "insight_summary": None,
-            "skill_gaps": None
-        }
+    # Check semantic cache for near-duplicate inputs
+    vector, semantic_hit = await find_semantic_hit(semantic_cache, data, tier, user["uid"])
+    if semantic_hit:
+        result, similarity = semantic_hit
+        with span("cache_write"):
+            await cache_response(cache_key, result, tier, db)
+        return {"result": result, "tier": tier, "cached": True, "similarity": round(similarity, 4)}
 
-        await cache_response(cache_key, result, tier, db)
-        await track_feature_usage(
-            user_uid=user["uid"],
-            feature="generate_questions",
-            metadata={
-                "tier": tier,
-                "jd_length": len(data.jd),
-                "resume_length": len(data.resume),
-                "cached": False
-            },
-            db=db
-        )
+    async def generate():
+        result = await generate_result(llm, data.jd, data.resume, is_pro, tier, user["uid"])
+
+        with span("cache_write"):
+            await cache_response(cache_key, result, tier, db)
+            if vector is not None:
+                await semantic_cache.store(vector, cache_key, result, tier, user["uid"])
+        return result
+
+    # Generate new response (identical concurrent misses share one LLM call)
+    try:
+        result, coalesced = await single_flight(cache_key, generate)
+
+        with span("track"):
+            await track_feature_usage(
+                user_uid=user["uid"],
+                feature="generate_questions",
+                metadata={
+                    "tier": tier,
+                    "jd_length": len(data.jd),
+                    "resume_length": len(data.resume),
+                    "cached": False,
+                    "coalesced": coalesced
+                },
+                db=db,
+                user_email=user["email"]
+            )
 
         logger.info(f"Generated content for {tier} user {user['email']}")
-        return {"result": result, "tier": tier, "cached": False}
+        return {"result": result, "tier": tier, "cached": False, "coalesced": coalesced}
 
-    except RateLimitError:
+    except GroqRateLimitError:
         raise RateLimitError()
     except Exception as e:
         logger.exception(f"LLM generation failed for user {user['uid']}")
         raise LLMServiceError()
 
 
-@app.post("/parse-resume", response_model=ParsedResume)
+@app.post("/generate/stream")
+@limiter.limit("10/minute")
+async def generate_questions_stream(
+    request: Request,
+    data: Input,
+    user: dict = Depends(get_current_user),
+    llm: ChatGroq = Depends(dependencies.get_llm),
+    db: firestore.Client = Depends(dependencies.get_db),
+    semantic_cache: SemanticCache = Depends(dependencies.get_semantic_cache)
+):
+    """
+    Streaming variant of /generate (NDJSON)
+
+    Emits one JSON object per line:
+    - {"event": "question", "section": ..., "text": ...} as each question completes
+    - {"event": "insight_summary" | "skill_gaps", "text": ...} for Pro users
+    - {"event": "done", "result": ..., "tier": ..., "cached": ...} with the final parsed result
+    - {"event": "error", "error": ...} if generation fails mid-stream
+
+    Uses the same exact and semantic caches as /generate, and identical
+    concurrent requests share one generation: the first streams it live,
+    the others replay the finished result.
+    """
+    validate_generate_input(data)
+    is_pro, tier = await get_user_tier(user["email"], db)
+
+    cache_key = generate_cache_key(data.jd, data.resume, tier)
+    cached_result = await get_cached_response(cache_key, db)
+    vector, similarity = None, None
+    if not cached_result:
+        vector, semantic_hit = await find_semantic_hit(semantic_cache, data, tier, user["uid"])
+        if semantic_hit:
+            cached_result, similarity = semantic_hit
+            await cache_response(cache_key, cached_result, tier, db)
+
+    async def event_stream():
+        if cached_result:
+            for event in result_events(cached_result):
+                yield ndjson(event)
+            done = {"event": "done", "result": cached_result, "tier": tier, "cached": True}
+            if similarity is not None:
+                done["similarity"] = round(similarity, 4)
+            yield ndjson(done)
+            return
+
+        # Filled only if this request runs the generation (not if it joins one)
+        events = asyncio.Queue()
+        finished = object()
+
+        async def generate():
+            result = await stream_result(llm, data.jd, data.resume, is_pro, tier, user["uid"], events)
+            await cache_response(cache_key, result, tier, db)
+            if vector is not None:
+                await semantic_cache.store(vector, cache_key, result, tier, user["uid"])
+            return result
+
+        # The generation itself is shielded: if this client disconnects it
+        # still completes and is cached for the requests sharing it
+        flight = asyncio.ensure_future(single_flight(cache_key, generate))
+        flight.add_done_callback(lambda _: events.put_nowait(finished))
+        try:
+            while True:
+                event = await events.get()
+                if event is finished:
+                    break
+                yield ndjson(event)
+            result, coalesced = flight.result()
+            if coalesced:
+                for event in result_events(result):
+                    yield ndjson(event)
+
+            await track_feature_usage(
+                user_uid=user["uid"],
+                feature="generate_questions",
+                metadata={
+                    "tier": tier,
+                    "jd_length": len(data.jd),
+                    "resume_length": len(data.resume),
+                    "cached": False,
+                    "coalesced": coalesced,
+                    "streamed": True
+                },
+                db=db,
+                user_email=user["email"]
+            )
+
+            logger.info(f"Streamed content for {tier} user {user['email']}")
+            yield ndjson({"event": "done", "result": result, "tier": tier, "cached": False, "coalesced": coalesced})
+
+        except Exception as e:
+            logger.exception(f"LLM streaming failed for user {user['uid']}")
+            error = RateLimitError() if isinstance(e, GroqRateLimitError) else LLMServiceError()
+            yield ndjson({"event": "error", "error": error.user_message, "type": error.__class__.__name__})
+        finally:
+            flight.cancel()
+
+    return ClosingStreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/generate/batch")
 @limiter.limit("5/minute")
-async def parse_resume(
+async def generate_questions_batch(
     request: Request,
-    data: ResumeInput,
+    data: BatchInput,
     user: dict = Depends(get_current_user),
-    qdrant: Qdrant = Depends(dependencies.get_qdrant),
     llm: ChatGroq = Depends(dependencies.get_llm),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Parse resume and add to candidate database with semantic search"""
-    structured_llm = llm.with_structured_output(ParsedResume)
-    prompt = parse_resume_prompt(data.resume_text)
+    """
+    Generate questions for one JD against several resumes (NDJSON)
 
-    try:
-        parsed_data = await call_llm_with_retry(structured_llm, prompt)
+    Each pair is checked against the cache; misses are generated
+    concurrently (as batch-priority LLM calls) and streamed as they finish:
+    - {"event": "candidate", "index": i, "name": ..., "result": ..., "cached": ...}
+    - {"event": "candidate_error", "index": i, "name": ..., "error": ...}
+    - {"event": "done", "tier": ..., "count": ..., "cached": ..., "failed": ...}
+    """
+    if len(data.jd.strip()) < 50:
+        raise InvalidInputError("Job Description", "Must be at least 50 characters long")
+    if not data.resumes:
+        raise InvalidInputError("Resumes", "Provide at least one resume")
+    if len(data.resumes) > GENERATE_BATCH_MAX:
+        raise InvalidInputError("Resumes", f"At most {GENERATE_BATCH_MAX} resumes per batch")
 
-        # Save to Firestore
-        doc_ref = db.collection("candidates").document()
-        doc_ref.set({
-            **parsed_data.model_dump(),
-            "user_uid": user["uid"],
-            "created_at": firestore.SERVER_TIMESTAMP
-        })
+    is_pro, tier = await get_user_tier(user["email"], db)
+
+    async def process(index: int, name: str, resume: str) -> dict:
+        event = {"index": index, "name": name}
+        if len(resume.strip()) < 100:
+            return {**event, "event": "candidate_error", "error": "Resume must be at least 100 characters long"}
 
-        # Build embedding content (improved with full experience)
-        experience_text = "\n".join([
-            f"- {exp.job_title} at {exp.company} ({exp.duration}): {exp.summary}"
-            for exp in parsed_data.experience
-        ])
+        cache_key = generate_cache_key(data.jd, resume, tier)
+        cached_result = await get_cached_response(cache_key, db)
+        if cached_result:
+            return {**event, "event": "candidate", "result": cached_result, "cached": True}
 
-        skills_text = ", ".join([
-            f"{s.name} ({s.level})" if hasattr(s, 'level') and s.level else s.name
-            for s in parsed_data.skills
-        ])
+        async def generate():
+            result = await generate_result(llm, data.jd, resume, is_pro, tier, user["uid"], interactive=False)
+            await cache_response(cache_key, result, tier, db)
+            return result
 
-        content_to_embed = f"""
+        try:
+            # Duplicate resumes in the batch (or in other requests) share one LLM call
+            result, coalesced = await single_flight(cache_key, generate)
+        except Exception as e:
+            logger.error(f"Batch generation failed for candidate {index} of user {user['uid']}: {e}")
+            error = RateLimitError() if isinstance(e, GroqRateLimitError) else LLMServiceError()
+            return {**event, "event": "candidate_error", "error": error.user_message}
+
+        await track_feature_usage(
+            user_uid=user["uid"],
+            feature="generate_questions",
+            metadata={
+                "tier": tier,
+                "jd_length": len(data.jd),
+                "resume_length": len(resume),
+                "cached": False,
+                "coalesced": coalesced,
+                "batch": True
+            },
+            db=db,
+            user_email=user["email"]
+        )
+        return {**event, "event": "candidate", "result": result, "cached": False}
+
+    async def event_stream():
+        tasks = [
+            asyncio.create_task(process(i, item.name or f"Candidate {i + 1}", item.resume))
+            for i, item in enumerate(data.resumes)
+        ]
+        counts = {"cached": 0, "failed": 0}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                event = await next_done
+                if event["event"] == "candidate_error":
+                    counts["failed"] += 1
+                elif event["cached"]:
+                    counts["cached"] += 1
+                yield ndjson(event)
+        finally:
+            # Client went away: drop pairs not yet handed to single_flight.
+            # Generations already in flight are shielded there and still
+            # finish into the cache, as on /generate/stream
+            for task in tasks:
+                task.cancel()
+
+        logger.info(f"Batch generated {len(tasks)} candidates for {tier} user {user['email']}")
+        yield ndjson({"event": "done", "tier": tier, "count": len(tasks), **counts})
+
+    return ClosingStreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+def candidate_point_id(content_hash: str) -> str:
+    """Deterministic Qdrant point id for a candidate, so re-ingests overwrite the same point"""
+    return str(uuid.UUID(content_hash[:32]))
+
+
+def skill_entry(skill) -> dict:
+    """{"name", "level"} for a parsed skill (the LLM returns dicts, strings or Skill objects)"""
+    if isinstance(skill, str):
+        return {"name": skill, "level": None}
+    if isinstance(skill, dict):
+        return {"name": skill.get("name", ""), "level": skill.get("level")}
+    return {"name": skill.name, "level": getattr(skill, "level", None)}
+
+
+def build_candidate_document(parsed_data: ParsedResume, firestore_id: str, user_uid: str) -> Document:
+    """Embedding text and payload for one parsed resume"""
+    # Build embedding content (improved with full experience)
+    experience_text = "\n".join([
+        f"- {exp.job_title} at {exp.company} ({exp.duration}): {exp.summary}"
+        for exp in parsed_data.experience
+    ])
+
+    skills = [skill_entry(s) for s in parsed_data.skills]
+    skills_text = ", ".join([
+        f"{s['name']} ({s['level']})" if s.get("level") else s["name"]
+        for s in skills
+    ])
+
+    content_to_embed = f"""
 Candidate: {parsed_data.full_name}
 Email: {parsed_data.email or 'Not provided'}
 Phone: {parsed_data.phone or 'Not provided'}
@@ -335,92 +759,316 @@ Work Experience:
 {experience_text}
 
 Total Years of Experience: {len(parsed_data.experience)} roles
-        """.strip()
+    """.strip()
+
+    return Document(
+        page_content=content_to_embed,
+        metadata={
+            "firestore_id": firestore_id,
+            "user_uid": user_uid,
+            "full_name": parsed_data.full_name,
+            "email": parsed_data.email or "",
+            # Display fields, so rankings are served from the payload alone
+            "summary": parsed_data.summary,
+            "skills": skills,
+            "experience_count": len(parsed_data.experience),
+            "skills_count": len(parsed_data.skills)
+        }
+    )
+
+
+def candidate_record(parsed_data: ParsedResume, user_uid: str) -> dict:
+    return {
+        **parsed_data.model_dump(),
+        "user_uid": user_uid,
+        "created_at": firestore.SERVER_TIMESTAMP
+    }
+
+
+@app.post("/parse-resume", response_model=ParsedResume)
+@limiter.limit("5/minute")
+async def parse_resume(
+    request: Request,
+    data: ResumeInput,
+    user: dict = Depends(get_current_user),
+    candidate_index: CandidateIndex = Depends(dependencies.get_candidate_index),
+    llm: ChatGroq = Depends(dependencies.get_llm),
+    db: firestore.Client = Depends(dependencies.get_db)
+):
+    """
+    Parse resume and add to candidate database with semantic search
+
+    Candidates are keyed by a per-user hash of the normalized resume text:
+    a resume the user has already added is returned from Firestore without
+    an LLM or embedding call, and re-ingests overwrite the same Qdrant point.
+    """
+    content_hash = resume_content_hash(user["uid"], data.resume_text)
+    doc_ref = db.collection("candidates").document(content_hash)
+
+    with span("dedup"):
+        existing = await run_firestore(doc_ref.get)
+    record_cache_lookup("parsed_resume", existing.exists)
+    if existing.exists:
+        logger.info(f"Resume already parsed for user {user['uid']}")
+        return ParsedResume(**existing.to_dict())
+
+    structured_llm = llm.with_structured_output(ParsedResume)
+    prompt = parse_resume_prompt(data.resume_text)
+    with span("tier"):
+        _, tier = await get_user_tier(user["email"], db)
+
+    try:
+        with span("llm"):
+            parsed_data = await call_llm_with_retry(
+                structured_llm, prompt, tier=tier, user=user["uid"], output_tokens=PARSE_RESUME_OUTPUT_TOKENS
+            )
 
         # Add to Qdrant
-        doc = Document(
-            page_content=content_to_embed,
-            metadata={
-                "firestore_id": doc_ref.id,
-                "user_uid": user["uid"],
-                "full_name": parsed_data.full_name,
-                "email": parsed_data.email or "",
-                "experience_count": len(parsed_data.experience),
-                "skills_count": len(parsed_data.skills)
-            }
-        )
+        doc = build_candidate_document(parsed_data, content_hash, user["uid"])
+        with span("vector_upsert"), embedding_context(user["uid"], "parse_resume"):
+            await candidate_index.add_documents([doc], ids=[candidate_point_id(content_hash)])
 
-        await qdrant.aadd_documents([doc], ids=[doc_ref.id])
+        # Save to Firestore last: an existing doc means the vector is in place too
+        with span("firestore_write"):
+            await run_firestore(doc_ref.set, candidate_record(parsed_data, user["uid"]))
         logger.info(f"Resume parsed for {parsed_data.full_name}")
         return parsed_data
 
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception(f"Failed to parse resume for user {user['uid']}")
         raise HTTPException(status_code=500, detail=f"Failed to parse resume: {str(e)}")
 
 
+@app.post("/parse-resumes/batch")
+@limiter.limit("2/minute")
+async def parse_resumes_batch(
+    request: Request,
+    data: ResumeBatchInput,
+    user: dict = Depends(get_current_user),
+    candidate_index: CandidateIndex = Depends(dependencies.get_candidate_index),
+    llm: ChatGroq = Depends(dependencies.get_llm),
+    db: firestore.Client = Depends(dependencies.get_db)
+):
+    """
+    Parse several resumes and add them to the candidate database in bulk
+
+    Resumes the user has already added (see /parse-resume) are returned as
+    they are, and duplicates within the batch are parsed once. The new ones
+    are parsed concurrently (as batch-priority LLM calls), embedded in as
+    few Voyage calls as EMBEDDING_BATCH_SIZE allows, upserted to Qdrant
+    together and saved with Firestore WriteBatches. A resume that fails to
+    parse is reported in "results" and doesn't fail the others.
+    """
+    if not data.resumes:
+        raise InvalidInputError("Resumes", "Provide at least one resume")
+    if len(data.resumes) > PARSE_BATCH_MAX:
+        raise InvalidInputError("Resumes", f"At most {PARSE_BATCH_MAX} resumes per batch")
+
+    hashes = [resume_content_hash(user["uid"], item.resume_text) for item in data.resumes]
+    # First index of each distinct resume; later copies reuse its result
+    unique = {}
+    for index, content_hash in enumerate(hashes):
+        unique.setdefault(content_hash, index)
+
+    collection = db.collection("candidates")
+    refs = {content_hash: collection.document(content_hash) for content_hash in unique}
+    with span("dedup"):
+        snapshots = await run_firestore(lambda: list(db.get_all(list(refs.values()))))
+    known = {snap.id: ParsedResume(**snap.to_dict()) for snap in snapshots if snap.exists}
+    for content_hash in unique:
+        record_cache_lookup("parsed_resume", content_hash in known)
+    to_parse = [content_hash for content_hash in unique if content_hash not in known]
+
+    outcomes = []
+    if to_parse:
+        structured_llm = llm.with_structured_output(ParsedResume)
+        with span("tier"):
+            _, tier = await get_user_tier(user["email"], db)
+
+        with span("llm"):
+            outcomes = await asyncio.gather(*(
+                call_llm_with_retry(
+                    structured_llm, parse_resume_prompt(data.resumes[unique[content_hash]].resume_text),
+                    tier=tier, user=user["uid"], interactive=False, output_tokens=PARSE_RESUME_OUTPUT_TOKENS
+                )
+                for content_hash in to_parse
+            ), return_exceptions=True)
+
+    parsed = {}
+    errors = {}
+    for content_hash, outcome in zip(to_parse, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"Batch parse failed for resume {unique[content_hash]} of user {user['uid']}: {outcome}")
+            error = outcome if isinstance(outcome, ScoutIQException) else LLMServiceError()
+            errors[content_hash] = error.user_message
+        else:
+            parsed[content_hash] = outcome
+
+    if parsed:
+        try:
+            docs = [
+                build_candidate_document(parsed_data, content_hash, user["uid"])
+                for content_hash, parsed_data in parsed.items()
+            ]
+            with span("vector_upsert"), embedding_context(user["uid"], "parse_resume"):
+                await candidate_index.add_documents(
+                    docs,
+                    ids=[candidate_point_id(content_hash) for content_hash in parsed],
+                    batch_size=EMBEDDING_BATCH_SIZE
+                )
+
+            # Save to Firestore last: an existing doc means the vector is in place too
+            items = list(parsed.items())
+
+            def write_candidates():
+                for start in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+                    batch = db.batch()
+                    for content_hash, parsed_data in items[start:start + FIRESTORE_BATCH_LIMIT]:
+                        batch.set(refs[content_hash], candidate_record(parsed_data, user["uid"]))
+                    batch.commit()
+
+            with span("firestore_write"):
+                await run_firestore(write_candidates)
+        except ScoutIQException:
+            raise
+        except Exception as e:
+            logger.exception(f"Failed to save parsed resumes for user {user['uid']}")
+            raise HTTPException(status_code=500, detail=f"Failed to save parsed resumes: {str(e)}")
+
+    results = []
+    for index, content_hash in enumerate(hashes):
+        if content_hash in errors:
+            results.append({"index": index, "status": "error", "error": errors[content_hash]})
+        else:
+            candidate = known.get(content_hash) or parsed[content_hash]
+            results.append({
+                "index": index,
+                "status": "ok",
+                "existing": content_hash in known,
+                "candidate": candidate.model_dump()
+            })
+
+    failed = sum(1 for result in results if result["status"] == "error")
+    logger.info(
+        f"Batch parsed {len(parsed)} new / {len(known)} known resumes "
+        f"({failed} failed) for user {user['uid']}"
+    )
+    return {"parsed": len(results) - failed, "new": len(parsed), "failed": failed, "results": results}
+
+
 @app.post("/rank-candidates")
 @limiter.limit("20/minute")
 async def rank_candidates(
     request: Request,
+    response: Response,
     data: JDInput,
     user: dict = Depends(get_current_user),
-    qdrant: Qdrant = Depends(dependencies.get_qdrant),
+    candidate_index: CandidateIndex = Depends(dependencies.get_candidate_index),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Rank candidates from database by relevance to job description"""
+    """
+    Rank candidates from database by relevance to job description
+
+    Semantic and keyword (BM25) matches are fused in one Qdrant query.
+    Results come from the Qdrant payload (name, email, summary, skills);
+    use GET /candidates/{candidate_id} for a full candidate document.
+
+    Paged with limit / offset; score_threshold is a minimum cosine
+    similarity, applied to the semantic leg before fusion, so it is not
+    comparable to the fused relevance_score of the results. The JD embedding is cached, so later pages don't re-embed it.
+    A page can hold fewer than `limit` candidates (hits without a stored
+    candidate are dropped), so paging uses the headers:
+    - X-Next-Offset: offset of the next page
+    - X-Has-More: "true" if Qdrant may have further matches
+    """
     try:
-        search_results = await qdrant.asimilarity_search(
-            data.jd,
-            k=10,
-            filter={"must": [{"key": "user_uid", "match": {"value": user["uid"]}}]}
-        )
+        with span("embed"), embedding_context(user["uid"], "rank_candidates"):
+            vector = await candidate_index.embed_query(data.jd)
+        with span("vector_search"):
+            ordered_candidates = await candidate_index.search(
+                vector,
+                user["uid"],
+                limit=data.limit,
+                offset=data.offset,
+                score_threshold=data.score_threshold,
+                text=data.jd
+            )
+        # From the Qdrant page, before any hits are dropped
+        response.headers["X-Next-Offset"] = str(data.offset + len(ordered_candidates))
+        response.headers["X-Has-More"] = "true" if len(ordered_candidates) == data.limit else "false"
 
-        if not search_results:
+        if not ordered_candidates:
             logger.info(f"No candidates found for user {user['uid']}")
             return []
 
-        # Fetch from Firestore
-        firestore_ids = [doc.metadata["firestore_id"] for doc in search_results]
-        candidate_refs = [db.collection("candidates").document(fid) for fid in firestore_ids]
-        candidate_docs = db.get_all(candidate_refs)
-
-        # Build ordered results
-        ordered_candidates = []
-        id_to_candidate = {c.id: c.to_dict() for c in candidate_docs if c.exists}
-
-        for i, doc in enumerate(search_results):
-            fs_id = doc.metadata["firestore_id"]
-            if fs_id in id_to_candidate:
-                candidate = id_to_candidate[fs_id]
-                candidate["relevance_score"] = round(doc.metadata.get("score", 0), 3)
-                candidate["rank"] = i + 1
-                ordered_candidates.append(candidate)
+        # Points ingested before display fields were stored need a Firestore read
+        legacy = [c for c in ordered_candidates if "summary" not in c]
+        if legacy:
+            candidate_refs = [db.collection("candidates").document(c["firestore_id"]) for c in legacy]
+            with span("hydrate"):
+                candidate_docs = await run_firestore(lambda: list(db.get_all(candidate_refs)))
+            id_to_candidate = {c.id: c.to_dict() for c in candidate_docs if c.exists}
+            for candidate in legacy:
+                stored = id_to_candidate.get(candidate["firestore_id"])
+                if stored is not None:
+                    candidate["summary"] = stored.get("summary", "")
+                    candidate["skills"] = [skill_entry(s) for s in stored.get("skills", [])]
+
+            # Drop points whose Firestore doc is gone (deleted, or an ingest
+            # that failed after the upsert); ranks keep their Qdrant positions
+            # so pages stay consistent
+            ordered_candidates = [c for c in ordered_candidates if "summary" in c]
 
         logger.info(f"Ranked {len(ordered_candidates)} candidates")
         return ordered_candidates
 
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception(f"Failed to rank candidates for user {user['uid']}")
         raise HTTPException(status_code=500, detail="Failed to rank candidates.")
 
 
+@app.get("/candidates/{candidate_id}")
+@limiter.limit("60/minute")
+async def get_candidate(
+    request: Request,
+    candidate_id: str,
+    user: dict = Depends(get_current_user),
+    db: firestore.Client = Depends(dependencies.get_db)
+):
+    """Full candidate document (the detail view for a ranking result)"""
+    snapshot = await run_firestore(db.collection("candidates").document(candidate_id).get)
+    candidate = snapshot.to_dict() if snapshot.exists else None
+    if not candidate or candidate.get("user_uid") != user["uid"]:
+        raise HTTPException(status_code=404, detail="Candidate not found.")
+    return {"firestore_id": candidate_id, **candidate}
+
+
 @app.post("/improve-resume")
 @limiter.limit("10/minute")
 async def improve_resume(
     request: Request,
     data: Input,
     user: dict = Depends(get_current_user),
-    llm: ChatGroq = Depends(dependencies.get_llm)
+    llm: ChatGroq = Depends(dependencies.get_llm),
+    db: firestore.Client = Depends(dependencies.get_db)
 ):
     """Job seeker mode: Get AI-powered resume improvement suggestions"""
     prompt = job_seeker_prompt(data.jd, data.resume)
+    _, tier = await get_user_tier(user["email"], db)
 
     try:
-        response = await call_llm_with_retry(llm, prompt)
+        response = await call_llm_with_retry(
+            llm, prompt, tier=tier, user=user["uid"], output_tokens=JOB_SEEKER_OUTPUT_TOKENS
+        )
         return {"improvements": response.content}
-    except RateLimitError:
+    except GroqRateLimitError:
         raise HTTPException(status_code=429, detail="Rate limit reached.")
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception(f"Error improving resume for user {user['uid']}")
         raise HTTPException(status_code=500, detail="Failed to generate improvements.")
@@ -434,7 +1082,7 @@ async def submit_feedback(
 ):
     """Submit user feedback"""
     try:
-        db.collection("feedback").add({
+        await run_firestore(db.collection("feedback").add, {
             "user_uid": user["uid"],
             "user_email": user.get("email"),
             "score": data.score,
@@ -443,6 +1091,8 @@ async def submit_feedback(
             "timestamp": firestore.SERVER_TIMESTAMP
         })
         return {"success": True}
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         logger.exception(f"Failed to save feedback for user {user['uid']}")
         raise HTTPException(status_code=500, detail="Failed to save feedback.")
@@ -455,27 +1105,95 @@ async def submit_feedback(
 @app.post("/admin/cleanup-cache")
 async def admin_cleanup_cache(
     user: dict = Depends(get_admin_user),
-    db: firestore.Client = Depends(dependencies.get_db)
+    db: firestore.Client = Depends(dependencies.get_db),
+    semantic_cache: SemanticCache = Depends(dependencies.get_semantic_cache)
 ):
     """Delete cache entries older than 24 hours"""
     try:
         count = await cleanup_old_cache(db)
+        if semantic_cache:
+            await semantic_cache.purge_expired()
         return {"deleted": count}
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception("Cache cleanup failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/admin/cache-stats")
+async def admin_cache_stats(
+    user: dict = Depends(get_admin_user),
+    semantic_cache: SemanticCache = Depends(dependencies.get_semantic_cache),
+    embedding_cache: CachedEmbeddings = Depends(dependencies.get_embedding_cache)
+):
+    """Get in-process cache statistics for the worker serving this request"""
+    return {
+        "l1": get_cache_stats(),
+        "single_flight": get_inflight_stats(),
+        "tiers": tier_cache.stats(),
+        "auth_tokens": token_cache.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_rate_governor": groq_governor.stats(),
+        "llm_hedging": llm_hedger.stats(),
+        "circuit_breakers": breaker_states(),
+        "embeddings": embedding_cache.stats() if embedding_cache else {"enabled": False},
+        "semantic": semantic_cache.stats() if semantic_cache else {"enabled": False}
+    }
+
+
+async def list_admin_collection(
+    collection_ref,
+    allowed_order_fields: tuple,
+    limit: int,
+    start_after: Optional[str],
+    order_by: str,
+    descending: bool,
+    format: str
+):
+    """Return one page of an admin collection as JSON, or the whole collection as NDJSON"""
+    if order_by not in allowed_order_fields:
+        raise HTTPException(status_code=400, detail=f"order_by must be one of {list(allowed_order_fields)}")
+
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(collection_ref, order_by=order_by, descending=descending),
+            media_type="application/x-ndjson"
+        )
+
+    try:
+        return await fetch_page(collection_ref, limit, start_after, order_by, descending)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/admin/usage-logs")
 async def get_usage_logs(
+    limit: int = Query(100, ge=1, le=1000),
+    start_after: Optional[str] = None,
+    order_by: str = "__name__",
+    descending: bool = False,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     user: dict = Depends(get_admin_user),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Get all usage logs"""
+    """
+    Get usage logs, one page at a time
+
+    Returns {"items", "next_cursor"}; pass next_cursor back as start_after for
+    the next page. format=ndjson streams the full collection instead.
+
+    usage_logs holds two document shapes: per-event entries (with "date") and
+    per-email summaries (total_generations/last_used_at). Firestore drops
+    documents missing the order_by field, so paging is by document id only.
+    """
     try:
-        logs_ref = db.collection("usage_logs").stream()
-        logs_list = [log.to_dict() for log in logs_ref]
-        return logs_list
+        return await list_admin_collection(
+            db.collection("usage_logs"), ("__name__",),
+            limit, start_after, order_by, descending, format
+        )
+    except (HTTPException, ScoutIQException):
+        raise
     except Exception as e:
         logger.exception("Failed to fetch usage logs")
         raise HTTPException(status_code=500, detail=str(e))
@@ -483,14 +1201,27 @@ async def get_usage_logs(
 
 @app.get("/admin/pro-users")
 async def get_pro_users(
+    limit: int = Query(100, ge=1, le=1000),
+    start_after: Optional[str] = None,
+    order_by: str = "__name__",
+    descending: bool = False,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     user: dict = Depends(get_admin_user),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Get all pro users"""
+    """
+    Get pro users, one page at a time
+
+    Returns {"items", "next_cursor"}; pass next_cursor back as start_after for
+    the next page. format=ndjson streams the full collection instead.
+    """
     try:
-        users_ref = db.collection("pro_users").stream()
-        users_list = [user.to_dict() for user in users_ref]
-        return users_list
+        return await list_admin_collection(
+            db.collection("pro_users"), ("__name__", "created_at", "tier"),
+            limit, start_after, order_by, descending, format
+        )
+    except (HTTPException, ScoutIQException):
+        raise
     except Exception as e:
         logger.exception("Failed to fetch pro users")
         raise HTTPException(status_code=500, detail=str(e))
@@ -498,72 +1229,107 @@ async def get_pro_users(
 
 @app.get("/admin/embedding-stats")
 async def get_embedding_stats(
+    days: int = Query(0, ge=0, le=90),
+    user_uid: Optional[str] = None,
     user: dict = Depends(get_admin_user),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Get embedding token usage statistics"""
+    """
+    Get embedding token usage statistics
+
+    Totals come from atomic counters updated on every embedding call.
+    Pass days=N for a per-day breakdown, and user_uid to include one
+    user's usage in it.
+    """
     try:
-        logs = db.collection("usage_logs").stream()
+        usage = await get_embedding_usage(db, days=days, user_uid=user_uid)
+        totals = usage["totals"]
+        operations = totals.get("operations", {})
+        # Batch parses embed many resumes per call, so count texts (older docs only have calls)
+        parse_ops = operations.get("parse_resume", {})
 
-        total_resumes_parsed = sum(1 for log in logs if log.to_dict().get("has_insights"))
-        estimated_tokens = total_resumes_parsed * 800
+        tokens_used = totals.get("tokens", 0)
         free_tier_limit = 200_000_000
-        percentage_used = (estimated_tokens / free_tier_limit) * 100
-
-        return {
-            "total_resumes_parsed": total_resumes_parsed,
-            "estimated_tokens_used": estimated_tokens,
+        percentage_used = (tokens_used / free_tier_limit) * 100
+
+        stats = {
+            "total_resumes_parsed": parse_ops.get("texts", parse_ops.get("calls", 0)),
+            "tokens_used": tokens_used,
+            "estimated_tokens_used": totals.get("estimated_tokens", 0),
+            "embedding_calls": totals.get("calls", 0),
+            "texts_embedded": totals.get("texts", 0),
+            "by_operation": operations,
             "free_tier_limit": free_tier_limit,
             "percentage_used": f"{percentage_used:.2f}%",
-            "tokens_remaining": free_tier_limit - estimated_tokens,
-            "model": "voyage-3.5-lite"
+            "tokens_remaining": free_tier_limit - tokens_used,
+            "model": totals.get("model", "voyage-3.5-lite")
         }
+        if days:
+            stats["daily"] = usage["daily"]
+        return stats
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception("Failed to fetch embedding stats")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/admin/purge-raw-analytics")
+async def admin_purge_raw_analytics(
+    user: dict = Depends(get_admin_user),
+    db: firestore.Client = Depends(dependencies.get_db)
+):
+    """Delete raw api_metrics / feature_usage docs older than the retention window"""
+    try:
+        return {"deleted": await purge_raw_analytics(db)}
+    except ScoutIQException:
+        raise
+    except Exception as e:
+        logger.exception("Raw analytics purge failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/admin/analytics/overview")
 async def get_analytics_overview(
     user: dict = Depends(get_admin_user),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Get high-level analytics overview (last 7 days)"""
+    """Get high-level analytics overview (last 7 days, from daily rollups)"""
     try:
-        seven_days_ago = datetime.now() - timedelta(days=7)
-        metrics_ref = db.collection("api_metrics").where("timestamp", ">=", seven_days_ago).stream()
+        buckets = await read_rollups(db, "day", 7)
 
         total_requests = 0
-        avg_response_time = []
+        latency_sum = 0.0
         status_codes = {}
-
-        for metric in metrics_ref:
-            data = metric.to_dict()
-            total_requests += 1
-            avg_response_time.append(data.get("duration_seconds", 0))
-            status_code = data.get("status_code", 500)
-            status_codes[status_code] = status_codes.get(status_code, 0) + 1
-
-        feature_usage_ref = db.collection("feature_usage").where("timestamp", ">=", seven_days_ago).stream()
+        latency_histogram = {}
         features = {}
-        for usage in feature_usage_ref:
-            feature = usage.to_dict().get("feature", "unknown")
-            features[feature] = features.get(feature, 0) + 1
-
         active_users = set()
-        for usage in db.collection("usage_logs").where("timestamp", ">=", seven_days_ago).stream():
-            active_users.add(usage.to_dict().get("email"))
+
+        for bucket in buckets:
+            total_requests += bucket.get("requests", 0)
+            latency_sum += bucket.get("latency_sum", 0.0)
+            for code, count in bucket.get("status_codes", {}).items():
+                status_codes[code] = status_codes.get(code, 0) + count
+            for upper, count in bucket.get("latency_histogram", {}).items():
+                latency_histogram[upper] = latency_histogram.get(upper, 0) + count
+            for feature, count in bucket.get("features", {}).items():
+                features[feature] = features.get(feature, 0) + count
+            active_users.update(bucket.get("active_users", []))
 
         return {
             "period": "last_7_days",
             "total_requests": total_requests,
-            "avg_response_time_seconds": round(sum(avg_response_time) / len(avg_response_time), 3) if avg_response_time else 0,
+            "avg_response_time_seconds": round(latency_sum / total_requests, 3) if total_requests else 0,
+            "p95_response_time_seconds": histogram_quantile(latency_histogram, 0.95),
+            "p99_response_time_seconds": histogram_quantile(latency_histogram, 0.99),
             "status_codes": status_codes,
-            "success_rate": f"{(status_codes.get(200, 0) / total_requests * 100):.1f}%" if total_requests > 0 else "0%",
+            "success_rate": f"{(status_codes.get('200', 0) / total_requests * 100):.1f}%" if total_requests > 0 else "0%",
             "feature_usage": features,
             "active_users": len(active_users),
             "most_used_feature": max(features.items(), key=lambda x: x[1])[0] if features else None
         }
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception("Failed to fetch analytics")
         raise HTTPException(status_code=500, detail=str(e))
@@ -574,29 +1340,26 @@ async def get_error_analytics(
     user: dict = Depends(get_admin_user),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Get error analytics (last 24 hours)"""
+    """Get error analytics (last 24 hours, from hourly rollups)"""
     try:
-        yesterday = datetime.now() - timedelta(hours=24)
-        error_metrics = db.collection("api_metrics").where(
-            "timestamp", ">=", yesterday
-        ).where("status_code", ">=", 400).stream()
+        buckets = await read_rollups(db, "hour", 24)
 
         errors_by_endpoint = {}
         errors_by_code = {}
 
-        for metric in error_metrics:
-            data = metric.to_dict()
-            endpoint = data.get("endpoint", "unknown")
-            status_code = data.get("status_code", 500)
+        for bucket in buckets:
+            for endpoint, stats in bucket.get("endpoints", {}).items():
+                if not stats.get("errors"):
+                    continue
 
-            if endpoint not in errors_by_endpoint:
-                errors_by_endpoint[endpoint] = {"count": 0, "codes": {}}
+                if endpoint not in errors_by_endpoint:
+                    errors_by_endpoint[endpoint] = {"count": 0, "codes": {}}
 
-            errors_by_endpoint[endpoint]["count"] += 1
-            errors_by_endpoint[endpoint]["codes"][status_code] = \
-                errors_by_endpoint[endpoint]["codes"].get(status_code, 0) + 1
-
-            errors_by_code[status_code] = errors_by_code.get(status_code, 0) + 1
+                errors_by_endpoint[endpoint]["count"] += stats["errors"]
+                for code, count in stats.get("codes", {}).items():
+                    errors_by_endpoint[endpoint]["codes"][code] = \
+                        errors_by_endpoint[endpoint]["codes"].get(code, 0) + count
+                    errors_by_code[code] = errors_by_code.get(code, 0) + count
 
         return {
             "period": "last_24_hours",
@@ -608,6 +1371,8 @@ async def get_error_analytics(
                 if data["count"] > 10
             ]
         }
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception("Failed to fetch error analytics")
         raise HTTPException(status_code=500, detail=str(e))
@@ -618,32 +1383,31 @@ async def get_user_analytics(
     user: dict = Depends(get_admin_user),
     db: firestore.Client = Depends(dependencies.get_db)
 ):
-    """Get user behavior analytics (last 30 days)"""
+    """Get user behavior analytics (last 30 days, from daily rollups)"""
     try:
-        pro_users = list(db.collection("pro_users").stream())
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        usage_logs = db.collection("usage_logs").where("timestamp", ">=", thirty_days_ago).stream()
+        pro_count_result = await run_firestore(db.collection("pro_users").count().get)
+        pro_user_count = int(pro_count_result[0][0].value)
+        buckets = await read_rollups(db, "day", 30)
 
+        # Newest bucket first, so the first tier/email seen is the latest
         user_activity = {}
-        for log in usage_logs:
-            data = log.to_dict()
-            email = data.get("email", "unknown")
-
-            if email not in user_activity:
-                user_activity[email] = {
-                    "total_generations": 0,
-                    "tier": data.get("tier", "free")
-                }
+        for bucket in buckets:
+            for uid, activity in bucket.get("user_activity", {}).items():
+                if uid not in user_activity:
+                    user_activity[uid] = {
+                        "email": activity.get("email", "unknown"),
+                        "total_generations": 0,
+                        "tier": activity.get("tier", "free")
+                    }
 
-            user_activity[email]["total_generations"] += 1
+                user_activity[uid]["total_generations"] += activity.get("generations", 0)
 
         total_users = len(user_activity)
         active_users = sum(1 for u in user_activity.values() if u["total_generations"] > 0)
-        pro_user_count = len(pro_users)
 
         top_users = sorted(
-            user_activity.items(),
-            key=lambda x: x[1]["total_generations"],
+            user_activity.values(),
+            key=lambda x: x["total_generations"],
             reverse=True
         )[:10]
 
@@ -656,13 +1420,15 @@ async def get_user_analytics(
             "conversion_rate": f"{(pro_user_count / total_users * 100):.1f}%" if total_users > 0 else "0%",
             "top_users": [
                 {
-                    "email": email,
+                    "email": data["email"],
                     "generations": data["total_generations"],
                     "tier": data["tier"]
                 }
-                for email, data in top_users
+                for data in top_users
             ]
         }
+    except ScoutIQException:
+        raise
     except Exception as e:
         logger.exception("Failed to fetch user analytics")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
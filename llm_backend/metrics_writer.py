@@ -0,0 +1,205 @@
+"""
+Buffered, batched writer for per-request api_metrics documents
+
+The request middleware only appends to an in-memory buffer; a background
+task drains it every flush interval (or as soon as a full batch is queued)
+and commits Firestore WriteBatches of up to 500 documents. Successful 2xx
+requests can be sampled; errors are always kept.
+
+Pending analytics rollup and embedding usage deltas are committed on a
+longer interval: every worker merges into the same current hour/day (and
+usage totals) docs, and Firestore sustains only about one write per second
+per document. Deltas whose commit fails are folded back into their
+aggregator and retried on the next flush.
+"""
+import os
+import time
+import random
+import asyncio
+from collections import deque
+import logging
+
+from llm_backend.firestore_io import run_firestore
+from llm_backend.rollups import RollupAggregator, ROLLUP_COLLECTION
+from llm_backend.embedding_usage import EmbeddingUsageTracker, EMBEDDING_USAGE_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+FIRESTORE_BATCH_LIMIT = 500
+
+
+class MetricsWriter:
+    """
+    Background api_metrics pipeline
+
+    Args:
+        db: Firestore client
+        flush_interval_ms: Maximum time a record waits in the buffer
+        max_batch: Documents per WriteBatch (Firestore caps this at 500)
+        max_queue: Buffer capacity; records beyond it are dropped
+        success_sample_rate: Fraction of 2xx requests to keep (0.0 - 1.0)
+        collection: Target collection
+        rollups: Rollup aggregator to drain
+        embedding_usage: Embedding usage tracker to drain (on the rollup interval)
+        rollup_flush_interval_ms: Time between rollup commits; keep it at
+            least (workers x 1s) so the shared bucket docs see under one
+            write per second
+    """
+
+    def __init__(
+        self,
+        db,
+        flush_interval_ms: int = 1000,
+        max_batch: int = FIRESTORE_BATCH_LIMIT,
+        max_queue: int = 10_000,
+        success_sample_rate: float = 1.0,
+        collection: str = "api_metrics",
+        rollups: RollupAggregator = None,
+        rollup_flush_interval_ms: int = 10_000,
+        embedding_usage: EmbeddingUsageTracker = None
+    ):
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = min(max_batch, FIRESTORE_BATCH_LIMIT)
+        self.max_queue = max_queue
+        self.success_sample_rate = success_sample_rate
+        self.collection = collection
+        self.rollups = rollups
+        self.embedding_usage = embedding_usage
+        self.rollup_flush_interval = rollup_flush_interval_ms / 1000
+        # Random first deadline so workers started together don't write in lockstep
+        self._rollups_due = time.monotonic() + random.uniform(0, self.rollup_flush_interval)
+        self._buffer = deque()
+        self._batch_ready = asyncio.Event()
+        self._task = None
+        self.written = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rollup_failures = 0
+
+    def record(self, metric: dict) -> bool:
+        """
+        Queue a metric document without blocking
+
+        Returns:
+            True if the record was queued, False if sampled out or dropped
+        """
+        status_code = metric.get("status_code", 500)
+        if 200 <= status_code < 300 and self.success_sample_rate < 1.0:
+            if random.random() >= self.success_sample_rate:
+                self.sampled_out += 1
+                return False
+            metric["sample_rate"] = self.success_sample_rate
+
+        if len(self._buffer) >= self.max_queue:
+            self.dropped += 1
+            return False
+
+        self._buffer.append(metric)
+        if len(self._buffer) >= self.max_batch:
+            self._batch_ready.set()
+        return True
+
+    def start(self):
+        """Start the background flush loop (call from within the event loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Metrics writer started.")
+
+    async def stop(self):
+        """Stop the flush loop and write out everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"Metrics writer stopped ({self.written} written, {self.dropped} dropped).")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush(rollups=time.monotonic() >= self._rollups_due)
+
+    async def flush(self, rollups: bool = True):
+        """Commit all buffered records (and pending rollup deltas) in batches"""
+        if rollups:
+            await self._flush_rollups()
+
+        while self._buffer:
+            docs = [self._buffer.popleft() for _ in range(min(self.max_batch, len(self._buffer)))]
+            try:
+                await run_firestore(self._commit, docs)
+                self.written += len(docs)
+            except Exception as e:
+                self.failed += len(docs)
+                logger.error(f"Failed to write {len(docs)} metrics: {e}")
+
+    async def _flush_rollups(self):
+        self._rollups_due = time.monotonic() + self.rollup_flush_interval
+        for aggregator, collection in (
+            (self.rollups, ROLLUP_COLLECTION),
+            (self.embedding_usage, EMBEDDING_USAGE_COLLECTION),
+        ):
+            if aggregator is None:
+                continue
+            buckets = aggregator.drain()
+            for i in range(0, len(buckets), self.max_batch):
+                chunk = buckets[i:i + self.max_batch]
+                try:
+                    await run_firestore(self._commit_rollups, aggregator, collection, chunk)
+                except Exception as e:
+                    # A WriteBatch is atomic, so none of the chunk was applied
+                    self.rollup_failures += 1
+                    aggregator.restore(chunk)
+                    logger.error(f"Failed to write {len(chunk)} {collection} docs, retrying next flush: {e}")
+
+    def _commit_rollups(self, aggregator, collection_name: str, buckets: list):
+        batch = self.db.batch()
+        collection = self.db.collection(collection_name)
+        for doc_id, bucket in buckets:
+            batch.set(collection.document(doc_id), aggregator.to_payload(bucket), merge=True)
+        batch.commit()
+
+    def _commit(self, docs: list):
+        batch = self.db.batch()
+        collection = self.db.collection(self.collection)
+        for doc in docs:
+            batch.set(collection.document(), doc)
+        batch.commit()
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._buffer),
+            "written": self.written,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rollup_failures": self.rollup_failures,
+            "success_sample_rate": self.success_sample_rate,
+        }
+
+
+def create_metrics_writer(
+    db,
+    rollups: RollupAggregator = None,
+    embedding_usage: EmbeddingUsageTracker = None
+) -> MetricsWriter:
+    """Build a MetricsWriter configured from environment variables"""
+    return MetricsWriter(
+        db,
+        rollups=rollups,
+        embedding_usage=embedding_usage,
+        flush_interval_ms=int(os.getenv("METRICS_FLUSH_INTERVAL_MS", "1000")),
+        max_batch=int(os.getenv("METRICS_BATCH_SIZE", str(FIRESTORE_BATCH_LIMIT))),
+        max_queue=int(os.getenv("METRICS_MAX_QUEUE", "10000")),
+        success_sample_rate=float(os.getenv("METRICS_SUCCESS_SAMPLE_RATE", "1.0")),
+        rollup_flush_interval_ms=int(os.getenv("ROLLUP_FLUSH_INTERVAL_MS", "10000")),
+    )
@@ -7,48 +7,86 @@ from fastapi import Request
 from firebase_admin import firestore
 import logging
 
+from llm_backend.metrics_writer import MetricsWriter
+from llm_backend.rollups import rollup_aggregator
+from llm_backend.prometheus import track_in_flight, observe_request, observe_stages
+from llm_backend.timing import request_timing, RequestTimings
 
 logger = logging.getLogger(__name__)
 
-async def track_request_middleware(request: Request, call_next, db: firestore.Client = None):
+
+def route_label(request: Request) -> str:
+    """Matched route template (e.g. /generate) so unknown paths don't explode cardinality"""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def record_request(
+    request: Request,
+    status_code: int,
+    duration: float,
+    timings: RequestTimings,
+    metrics_writer: MetricsWriter = None
+):
+    """Feed one finished request into Prometheus, the rollups and api_metrics"""
+    route = route_label(request)
+    observe_request(route, request.method, status_code, duration)
+    observe_stages(route, timings.stages)
+
+    # Track metrics (buffered; written in batches by a background task)
+    if metrics_writer:
+        rollup_aggregator.add_request(route, status_code, duration)
+        metric = {
+            "endpoint": request.url.path,
+            "method": request.method,
+            "status_code": status_code,
+            "duration_seconds": round(duration, 3),
+            "timestamp": firestore.SERVER_TIMESTAMP,
+            "user_agent": request.headers.get("user-agent", "unknown")
+        }
+        if timings.stages:
+            metric["stages"] = {name: round(seconds, 3) for name, seconds in timings.stages.items()}
+        metrics_writer.record(metric)
+
+
+async def track_request_middleware(request: Request, call_next, metrics_writer: MetricsWriter = None):
     """
     Middleware to track all API requests for monitoring
-    
+
     Logs:
     - Request method and path
     - Response status code
     - Request duration
     - User agent
+
+    Also feeds the Prometheus request histogram and in-flight gauge, and
+    reports stages timed with llm_backend.timing.span() in a Server-Timing
+    header.
     """
     start_time = time.time()
-    
+
     # Log request
     logger.info(f"{request.method} {request.url.path}")
-    
-    try:
-        response = await call_next(request)
-        duration = time.time() - start_time
-        
-        # Log response
-        logger.info(f"{request.method} {request.url.path} - {response.status_code} ({duration:.2f}s)")
-        
-        # Track metrics (async, don't block response)
-        if db:
+
+    with request_timing() as timings:
+        try:
+            with track_in_flight():
+                response = await call_next(request)
+            duration = time.time() - start_time
+
+            # Log response
+            logger.info(f"{request.method} {request.url.path} - {response.status_code} ({duration:.2f}s)")
+            response.headers["Server-Timing"] = timings.server_timing(total=duration)
+
             try:
-                db.collection("api_metrics").add({
-                    "endpoint": request.url.path,
-                    "method": request.method,
-                    "status_code": response.status_code,
-                    "duration_seconds": round(duration, 3),
-                    "timestamp": firestore.SERVER_TIMESTAMP,
-                    "user_agent": request.headers.get("user-agent", "unknown")
-                })
+                record_request(request, response.status_code, duration, timings, metrics_writer)
             except Exception as e:
                 logger.error(f"Failed to log metrics: {e}")
-        
-        return response
-    
-    except Exception as e:
-        duration = time.time() - start_time
-        logger.error(f"{request.method} {request.url.path} failed ({duration:.2f}s): {e}")
-        raise
+
+            return response
+
+        except Exception as e:
+            duration = time.time() - start_time
+            logger.error(f"{request.method} {request.url.path} failed ({duration:.2f}s): {e}")
+            record_request(request, 500, duration, timings, metrics_writer)
+            raise
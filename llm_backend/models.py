@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class Skill(BaseModel):
@@ -23,11 +23,27 @@ class Input(BaseModel):
     jd: str
     resume: str
 
+class BatchResume(BaseModel):
+    name: Optional[str] = None
+    resume: str
+
+class BatchInput(BaseModel):
+    jd: str
+    resumes: List[BatchResume]
+
 class ResumeInput(BaseModel):
     resume_text: str
 
+class ResumeBatchInput(BaseModel):
+    resumes: List[ResumeInput]
+
 class JDInput(BaseModel):
     jd: str
+    limit: int = Field(10, ge=1, le=100)
+    offset: int = Field(0, ge=0, le=10_000)
+    # Minimum cosine similarity to the JD. In hybrid search it filters the
+    # semantic leg before fusion; relevance_score is then the RRF score
+    score_threshold: Optional[float] = Field(None, ge=0, le=1)
 
 class FeedbackInput(BaseModel):
     score: str
@@ -0,0 +1,151 @@
+"""
+Prometheus metrics for the backend
+
+Request latency histograms per route, in-flight requests, dependency call
+latencies (LLM, Qdrant, Firestore, Voyage, Firebase Auth), per-stage
+request timings and cache hit/miss counters, exposed in Prometheus text
+format at /metrics.
+
+Multi-worker: when PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py),
+prometheus_client keeps each worker's samples in files under that directory
+and /metrics aggregates all of them, so a scrape from any worker reports the
+whole server rather than the one process that happened to answer.
+"""
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds; matches the analytics rollup buckets so both views line up
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DEPENDENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    "scoutiq_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["route", "method", "status"],
+    buckets=REQUEST_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "scoutiq_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum"
+)
+DEPENDENCY_LATENCY = Histogram(
+    "scoutiq_dependency_duration_seconds",
+    "Latency of calls to external dependencies",
+    ["dependency", "operation", "outcome"],
+    buckets=DEPENDENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "scoutiq_stage_duration_seconds",
+    "Time spent in each stage of a request (see llm_backend.timing)",
+    ["route", "stage"],
+    buckets=DEPENDENCY_BUCKETS
+)
+LLM_QUEUE_TIME = Histogram(
+    "scoutiq_llm_queue_seconds",
+    "Time LLM calls wait for a scheduler slot",
+    ["tier", "mode"],
+    buckets=DEPENDENCY_BUCKETS
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "scoutiq_llm_queued",
+    "LLM calls waiting for a scheduler slot",
+    multiprocess_mode="livesum"
+)
+LLM_RATE_WAIT = Histogram(
+    "scoutiq_llm_rate_wait_seconds",
+    "Time LLM calls are delayed locally to stay under Groq rate limits",
+    buckets=DEPENDENCY_BUCKETS
+)
+LLM_IN_FLIGHT = Gauge(
+    "scoutiq_llm_in_flight",
+    "LLM calls currently holding a scheduler slot",
+    multiprocess_mode="livesum"
+)
+LLM_HEDGES = Counter(
+    "scoutiq_llm_hedges_total",
+    "Hedged LLM requests (fired) and how many of them won",
+    ["event"]
+)
+CIRCUIT_STATE = Gauge(
+    "scoutiq_circuit_state",
+    "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)",
+    ["dependency"],
+    multiprocess_mode="livemax"
+)
+CIRCUIT_REJECTIONS = Counter(
+    "scoutiq_circuit_rejections_total",
+    "Calls failed fast because a circuit breaker was open",
+    ["dependency"]
+)
+CACHE_LOOKUPS = Counter(
+    "scoutiq_cache_lookups_total",
+    "Cache lookups by cache layer and result",
+    ["cache", "result"]
+)
+
+
+@contextmanager
+def track_in_flight():
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+
+
+def observe_request(route: str, method: str, status_code: int, duration: float):
+    REQUEST_LATENCY.labels(route, method, str(status_code)).observe(duration)
+
+
+def observe_stages(route: str, stages: dict):
+    for stage, duration in stages.items():
+        STAGE_LATENCY.labels(route, stage).observe(duration)
+
+
+@contextmanager
+def observe_dependency(dependency: str, operation: str):
+    """
+    Time a dependency call
+
+    Example:
+        vector = await embeddings.aembed_query(text)
+        with observe_dependency("qdrant", "query_points"):
+            response = await asyncio.to_thread(client.query_points, collection_name, query=vector)
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        DEPENDENCY_LATENCY.labels(dependency, operation, outcome).observe(time.perf_counter() - start)
+
+
+def record_cache_lookup(cache: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(count)
+
+
+def render_metrics() -> tuple:
+    """
+    Returns:
+        Tuple of (body, content_type) for the /metrics response
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
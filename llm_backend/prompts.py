@@ -1,3 +1,15 @@
+# Expected completion sizes, budgeted against the Groq token quota before each call
+FREE_TIER_OUTPUT_TOKENS = 600
+PRO_TIER_OUTPUT_TOKENS = 1500
+PARSE_RESUME_OUTPUT_TOKENS = 800
+JOB_SEEKER_OUTPUT_TOKENS = 1000
+
+
+def estimate_prompt_tokens(prompt: str) -> int:
+    """Rough Llama 3 token count (~4 characters per token, plus chat template overhead)"""
+    return len(prompt) // 4 + 10
+
+
 def free_tier_prompt(jd_text: str, resume_text: str) -> str:
     """Only generates interview questions for free users"""
     return f"""
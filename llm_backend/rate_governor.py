@@ -0,0 +1,207 @@
+"""
+Client-side rate governor for Groq
+
+Tracks request and token budgets as token buckets and delays calls locally
+just long enough to stay under quota, instead of sending them and backing
+off on RateLimitError. The buckets start from GROQ_RPM_LIMIT /
+GROQ_TPM_LIMIT and are corrected from the x-ratelimit-* headers on every
+Groq response (which also reflect usage by the other workers), via httpx
+event hooks on the clients handed to ChatGroq.
+
+Calls are admitted by LLMScheduler (utils), which reserves budget for the
+highest-priority waiting call only: waiting for budget holds no scheduler
+slot and keeps the scheduler's priority order.
+"""
+import os
+import re
+import time
+import threading
+import httpx
+import logging
+
+from llm_backend.prometheus import LLM_RATE_WAIT
+
+logger = logging.getLogger(__name__)
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+# Longest the LLM queue waits for budget before the next call goes ahead anyway
+MAX_GOVERNOR_WAIT_SECONDS = 60
+
+
+def parse_reset(value: str) -> float:
+    """Parse Groq reset durations like "7.66s", "2m59.56s" or "120ms" into seconds"""
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in _DURATION_RE.findall(value))
+
+
+class TokenBucket:
+    """
+    Continuously refilling budget
+
+    Args:
+        capacity: Maximum budget (the provider's limit)
+        refill_per_second: Budget regained per second
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)"""
+        self._refill(now)
+        blocked = max(0.0, self.blocked_until - now)
+        # Never wait for more than a full bucket's worth
+        deficit = min(amount, self.capacity) - self.level
+        if deficit <= 0:
+            return blocked
+        return max(blocked, deficit / self.refill_per_second)
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def sync(self, remaining: float, reset_seconds: float, now: float, per_minute_limit: float = None):
+        """
+        Adopt the provider's view of this budget
+
+        Args:
+            remaining: Provider-reported remaining budget
+            reset_seconds: Time until the provider's window resets
+            now: Current monotonic time
+            per_minute_limit: Provider limit, when its window is one minute
+        """
+        self._refill(now)
+        if per_minute_limit:
+            self.capacity = per_minute_limit
+            self.refill_per_second = per_minute_limit / 60
+        # Remaining can only lower our estimate: calls still in flight aren't in it yet
+        self.level = min(self.level, remaining)
+        if remaining <= 0 and reset_seconds > 0:
+            self.blocked_until = max(self.blocked_until, now + reset_seconds)
+
+
+class RateGovernor:
+    """
+    Request and token budgets for one provider
+
+    Args:
+        requests_per_minute: Initial request budget
+        tokens_per_minute: Initial token budget (prompt + completion)
+    """
+
+    def __init__(self, requests_per_minute: int = 30, tokens_per_minute: int = 12_000):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self._lock = threading.Lock()
+        self.delayed_calls = 0
+        self.total_wait = 0.0
+        self.rate_limited_responses = 0
+
+    def reserve(self, tokens: int, force: bool = False) -> float:
+        """
+        Spend one request and `tokens` tokens if they fit in the budget
+
+        Args:
+            tokens: Prompt + completion estimate
+            force: Spend even if over budget (the call has waited long enough)
+
+        Returns:
+            0 if the budget was spent, otherwise seconds until it should fit
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0 and not force:
+                return wait
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            return 0.0
+
+    def record_wait(self, waited: float, tokens: int):
+        """Account for the time a call spent waiting for budget"""
+        LLM_RATE_WAIT.observe(waited)
+        if waited > 0.01:
+            self.delayed_calls += 1
+            self.total_wait += waited
+            logger.info(f"Rate governor delayed LLM call by {waited:.2f}s ({tokens} tokens)")
+
+    def update_from_headers(self, headers, status_code: int = 200):
+        """Resync both buckets from x-ratelimit-* (and retry-after on 429) headers"""
+        now = time.monotonic()
+        with self._lock:
+            # Groq's request limit is per day and its token limit per minute;
+            # only the latter can replace the locally configured per-minute budget
+            for name, bucket, per_minute in (("requests", self.requests, False), ("tokens", self.tokens, True)):
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if remaining is None:
+                    continue
+                try:
+                    limit = headers.get(f"x-ratelimit-limit-{name}")
+                    bucket.sync(
+                        remaining=float(remaining),
+                        reset_seconds=parse_reset(headers.get(f"x-ratelimit-reset-{name}")),
+                        now=now,
+                        per_minute_limit=float(limit) if per_minute and limit else None
+                    )
+                except ValueError:
+                    logger.warning(f"Unparseable x-ratelimit-*-{name} headers")
+
+            if status_code == 429:
+                self.rate_limited_responses += 1
+                retry_after = parse_reset(headers.get("retry-after")) or 1.0
+                for bucket in (self.requests, self.tokens):
+                    bucket.blocked_until = max(bucket.blocked_until, now + retry_after)
+
+    async def _on_async_response(self, response: httpx.Response):
+        self.update_from_headers(response.headers, response.status_code)
+
+    def _on_response(self, response: httpx.Response):
+        self.update_from_headers(response.headers, response.status_code)
+
+    def http_clients(self) -> tuple:
+        """
+        httpx clients that feed response headers back into the governor
+
+        Returns:
+            Tuple of (httpx.Client, httpx.AsyncClient) for ChatGroq's
+            http_client / http_async_client
+        """
+        return (
+            httpx.Client(event_hooks={"response": [self._on_response]}),
+            httpx.AsyncClient(event_hooks={"response": [self._on_async_response]}),
+        )
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "requests_available": round(self.requests.level, 1),
+                "requests_capacity": self.requests.capacity,
+                "tokens_available": round(self.tokens.level),
+                "tokens_capacity": self.tokens.capacity,
+                "delayed_calls": self.delayed_calls,
+                "total_wait_seconds": round(self.total_wait, 2),
+                "rate_limited_responses": self.rate_limited_responses,
+            }
+
+
+groq_governor = RateGovernor(
+    requests_per_minute=int(os.getenv("GROQ_RPM_LIMIT", "30")),
+    tokens_per_minute=int(os.getenv("GROQ_TPM_LIMIT", "12000"))
+)
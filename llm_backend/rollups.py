@@ -0,0 +1,286 @@
+"""
+Pre-aggregated analytics rollups
+
+Request and feature-usage events are folded into per-hour and per-day
+bucket documents in the analytics_rollups collection at ingest time, so
+the admin analytics endpoints read a few dozen small docs instead of
+scanning every raw api_metrics / feature_usage document.
+
+Bucket doc ids: "hour_2025-01-31T14" and "day_2025-01-31" (UTC).
+"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from firebase_admin import firestore
+import logging
+
+from llm_backend.firestore_io import run_firestore, run_firestore_job
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "analytics_rollups"
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+RAW_ANALYTICS_RETENTION_DAYS = int(os.getenv("RAW_ANALYTICS_RETENTION_DAYS", "30"))
+HOURLY_ROLLUP_RETENTION_DAYS = int(os.getenv("HOURLY_ROLLUP_RETENTION_DAYS", "7"))
+
+
+def hour_bucket_id(ts: datetime) -> str:
+    return f"hour_{ts:%Y-%m-%dT%H}"
+
+
+def day_bucket_id(ts: datetime) -> str:
+    return f"day_{ts:%Y-%m-%d}"
+
+
+def latency_bucket(duration: float) -> str:
+    """Histogram bucket label for a request duration"""
+    for upper in LATENCY_BUCKETS:
+        if duration <= upper:
+            return str(upper)
+    return "+Inf"
+
+
+def histogram_quantile(histogram: dict, q: float):
+    """
+    Estimate a quantile from a latency histogram
+
+    Returns the upper bound of the bucket containing the quantile
+    (None if the histogram is empty or the quantile falls in +Inf).
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for upper in LATENCY_BUCKETS:
+        seen += histogram.get(str(upper), 0)
+        if seen >= target:
+            return upper
+    return None
+
+
+def _bump(target: dict, key, amount=1):
+    target[key] = target.get(key, 0) + amount
+
+
+class RollupAggregator:
+    """
+    In-memory accumulator of rollup deltas between flushes
+
+    Deltas are applied with Firestore Increment / ArrayUnion transforms, so
+    any number of workers can flush into the same bucket docs concurrently.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _bucket(self, doc_id: str, granularity: str, start: datetime) -> dict:
+        bucket = self._buckets.get(doc_id)
+        if bucket is None:
+            bucket = {
+                "granularity": granularity,
+                "bucket_start": start,
+                "requests": 0,
+                "latency_sum": 0.0,
+                "status_codes": {},
+                "latency_histogram": {},
+                "endpoints": {},
+                "features": {},
+                "active_users": set(),
+                "user_activity": {},
+            }
+            self._buckets[doc_id] = bucket
+        return bucket
+
+    def _buckets_for(self, ts: datetime = None) -> list:
+        ts = ts or datetime.now(timezone.utc)
+        hour_start = ts.replace(minute=0, second=0, microsecond=0)
+        day_start = hour_start.replace(hour=0)
+        return [
+            self._bucket(hour_bucket_id(ts), "hour", hour_start),
+            self._bucket(day_bucket_id(ts), "day", day_start),
+        ]
+
+    def add_request(self, endpoint: str, status_code: int, duration: float, ts: datetime = None):
+        """Fold one API request into the current hour/day buckets"""
+        code = str(status_code)
+        with self._lock:
+            for bucket in self._buckets_for(ts):
+                bucket["requests"] += 1
+                bucket["latency_sum"] += duration
+                _bump(bucket["status_codes"], code)
+                _bump(bucket["latency_histogram"], latency_bucket(duration))
+
+                stats = bucket["endpoints"].setdefault(endpoint, {"count": 0, "errors": 0, "codes": {}})
+                stats["count"] += 1
+                if status_code >= 400:
+                    stats["errors"] += 1
+                    _bump(stats["codes"], code)
+
+    def add_feature(self, feature: str, user_uid: str, tier: str = None, user_email: str = None, ts: datetime = None):
+        """Fold one feature-usage event into the current hour/day buckets"""
+        with self._lock:
+            for bucket in self._buckets_for(ts):
+                _bump(bucket["features"], feature)
+                bucket["active_users"].add(user_uid)
+
+                if feature == "generate_questions":
+                    activity = bucket["user_activity"].setdefault(user_uid, {"generations": 0})
+                    activity["generations"] += 1
+                    if tier:
+                        activity["tier"] = tier
+                    if user_email:
+                        activity["email"] = user_email
+
+    def drain(self) -> list:
+        """
+        Take all pending deltas
+
+        Returns:
+            List of (doc_id, bucket) tuples; to_payload() turns a bucket
+            into its Firestore merge payload
+        """
+        with self._lock:
+            buckets, self._buckets = self._buckets, {}
+
+        return list(buckets.items())
+
+    def restore(self, buckets: list):
+        """Fold drained deltas back in (their write failed), to retry on the next flush"""
+        with self._lock:
+            for doc_id, drained in buckets:
+                bucket = self._bucket(doc_id, drained["granularity"], drained["bucket_start"])
+                bucket["requests"] += drained["requests"]
+                bucket["latency_sum"] += drained["latency_sum"]
+                for key in ("status_codes", "latency_histogram", "features"):
+                    for name, count in drained[key].items():
+                        _bump(bucket[key], name, count)
+                for endpoint, drained_stats in drained["endpoints"].items():
+                    stats = bucket["endpoints"].setdefault(endpoint, {"count": 0, "errors": 0, "codes": {}})
+                    stats["count"] += drained_stats["count"]
+                    stats["errors"] += drained_stats["errors"]
+                    for code, count in drained_stats["codes"].items():
+                        _bump(stats["codes"], code, count)
+                bucket["active_users"] |= drained["active_users"]
+                for uid, drained_activity in drained["user_activity"].items():
+                    # Newer tier/email (already pending) win over the restored ones
+                    activity = bucket["user_activity"].setdefault(uid, {"generations": 0})
+                    activity["generations"] += drained_activity["generations"]
+                    for key, value in drained_activity.items():
+                        activity.setdefault(key, value)
+
+    @staticmethod
+    def to_payload(bucket: dict) -> dict:
+        """Firestore merge payload (Increment / ArrayUnion transforms) for a drained bucket"""
+        def increments(counts: dict) -> dict:
+            return {key: firestore.Increment(value) for key, value in counts.items()}
+
+        payload = {
+            "granularity": bucket["granularity"],
+            "bucket_start": bucket["bucket_start"],
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        }
+        if bucket["requests"]:
+            payload["requests"] = firestore.Increment(bucket["requests"])
+            payload["latency_sum"] = firestore.Increment(round(bucket["latency_sum"], 6))
+            payload["status_codes"] = increments(bucket["status_codes"])
+            payload["latency_histogram"] = increments(bucket["latency_histogram"])
+            payload["endpoints"] = {
+                endpoint: {
+                    "count": firestore.Increment(stats["count"]),
+                    "errors": firestore.Increment(stats["errors"]),
+                    "codes": increments(stats["codes"]),
+                }
+                for endpoint, stats in bucket["endpoints"].items()
+            }
+        if bucket["features"]:
+            payload["features"] = increments(bucket["features"])
+            payload["active_users"] = firestore.ArrayUnion(sorted(bucket["active_users"]))
+        if bucket["user_activity"]:
+            payload["user_activity"] = {
+                uid: {
+                    **{k: v for k, v in activity.items() if k != "generations"},
+                    "generations": firestore.Increment(activity["generations"]),
+                }
+                for uid, activity in bucket["user_activity"].items()
+            }
+        return payload
+
+
+rollup_aggregator = RollupAggregator()
+
+
+async def read_rollups(db: "firestore.Client", granularity: str, count: int) -> list:
+    """
+    Fetch the most recent `count` buckets of a granularity (including the current one)
+
+    Args:
+        db: Firestore client
+        granularity: "hour" or "day"
+        count: Number of buckets to read
+
+    Returns:
+        List of bucket dicts, newest first (missing buckets are skipped)
+    """
+    now = datetime.now(timezone.utc)
+    if granularity == "hour":
+        doc_ids = [hour_bucket_id(now - timedelta(hours=i)) for i in range(count)]
+    else:
+        doc_ids = [day_bucket_id(now - timedelta(days=i)) for i in range(count)]
+
+    refs = [db.collection(ROLLUP_COLLECTION).document(doc_id) for doc_id in doc_ids]
+    docs = await run_firestore(lambda: list(db.get_all(refs)))
+    buckets = [doc.to_dict() for doc in docs if doc.exists]
+    return sorted(buckets, key=lambda bucket: bucket["bucket_start"], reverse=True)
+
+
+async def purge_raw_analytics(db: "firestore.Client", retention_days: int = RAW_ANALYTICS_RETENTION_DAYS) -> dict:
+    """
+    Delete raw analytics docs (and hourly buckets) past their retention window
+
+    Daily rollups are kept; they are what the dashboards read.
+
+    Args:
+        db: Firestore client
+        retention_days: Age after which raw api_metrics / feature_usage docs are deleted
+
+    Returns:
+        Dict of collection -> number of deleted docs
+    """
+    def delete_where(query, keep=None) -> int:
+        batch = db.batch()
+        count = 0
+        for doc in query.stream():
+            if keep and keep(doc):
+                continue
+            batch.delete(doc.reference)
+            count += 1
+            if count % 500 == 0:  # Firestore batch limit
+                batch.commit()
+                batch = db.batch()
+        batch.commit()
+        return count
+
+    def purge() -> dict:
+        raw_cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        hourly_cutoff = datetime.now(timezone.utc) - timedelta(days=HOURLY_ROLLUP_RETENTION_DAYS)
+        return {
+            "api_metrics": delete_where(
+                db.collection("api_metrics").where("timestamp", "<", raw_cutoff)
+            ),
+            "feature_usage": delete_where(
+                db.collection("feature_usage").where("timestamp", "<", raw_cutoff)
+            ),
+            "hourly_rollups": delete_where(
+                db.collection(ROLLUP_COLLECTION).where("bucket_start", "<", hourly_cutoff),
+                keep=lambda doc: doc.get("granularity") != "hour"
+            ),
+        }
+
+    deleted = await run_firestore_job(purge)
+    logger.info(f"Purged raw analytics: {deleted}")
+    return deleted
@@ -1,8 +1,21 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
 import firebase_admin
 from firebase_admin import auth, credentials
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
+from llm_backend.prometheus import observe_dependency, record_cache_lookup
+from llm_backend.timing import span
+
+logger = logging.getLogger(__name__)
+
 # This tells FastAPI to look for a token in the Authorization header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -14,13 +27,125 @@ if not firebase_admin._apps:
         print(f"Warning: Could not initialize Firebase Admin SDK: {e}")
         pass
 
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified ID tokens, keyed by a hash of the raw token
+
+    Entries live until the token's own `exp` claim, so a cached token is
+    never accepted after Firebase would have rejected it as expired.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sha256(token) -> (exp, decoded)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def set(self, token: str, decoded: dict):
+        exp = decoded.get("exp")
+        if not exp:
+            return
+        with self._lock:
+            self._entries[self._key(token)] = (exp, decoded)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+token_cache = VerifiedTokenCache(max_entries=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000")))
+
+
+def _certificate_fetcher():
+    """
+    (request, url) for the session verify_id_token fetches certs through
+
+    firebase_admin has no public hook for this session, so this reaches into
+    its internals (firebase-admin is pinned to 7.x in requirements.in).
+    Raises AttributeError/ImportError if a release moves them.
+    """
+    from firebase_admin import _token_gen
+    return auth._get_client(None)._token_verifier.request, _token_gen.ID_TOKEN_CERT_URI
+
+
+def prefetch_certificates() -> bool:
+    """
+    Warm firebase_admin's HTTP-cached copy of Google's ID-token signing certs
+
+    verify_id_token fetches these through a cache-control aware session; hitting
+    the same session here keeps the fetch off the request path.
+
+    Returns False if the SDK's internals have changed and prefetching is not
+    possible; verify_id_token then fetches the certs on demand as usual.
+    """
+    try:
+        request, url = _certificate_fetcher()
+        request(url=url, method="GET")
+        logger.debug("ID token certificates refreshed")
+    except (AttributeError, ImportError) as e:
+        logger.warning(f"ID token certificate prefetch unavailable with this firebase-admin: {e}")
+        return False
+    except Exception as e:
+        logger.warning(f"Failed to prefetch ID token certificates: {e}")
+    return True
+
+
+async def refresh_certificates_periodically(interval_seconds: float = None):
+    """Background task: prefetch signing certs at startup and then on an interval"""
+    interval = interval_seconds or float(os.getenv("TOKEN_CERT_REFRESH_SECONDS", "300"))
+    while await asyncio.to_thread(prefetch_certificates):
+        await asyncio.sleep(interval)
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Dependency to verify Firebase ID token.
     Returns the decoded token dictionary if valid.
+
+    Verified tokens are cached until they expire, so repeat calls within a
+    session skip signature verification.
     """
+    with span("auth"):
+        return await _verify_token(token)
+
+
+async def _verify_token(token: str) -> dict:
+    cached = token_cache.get(token)
+    record_cache_lookup("auth_token", cached is not None)
+    if cached is not None:
+        return cached
+
     try:
-        decoded_token = auth.verify_id_token(token)
+        with observe_dependency("firebase_auth", "verify_id_token"):
+            decoded_token = await asyncio.to_thread(auth.verify_id_token, token)
+        token_cache.set(token, decoded_token)
         return decoded_token
     except auth.InvalidIdTokenError:
         raise HTTPException(
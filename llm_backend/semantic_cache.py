@@ -0,0 +1,196 @@
+"""
+Semantic near-duplicate cache for LLM responses
+
+Exact cache keys miss on trivially different inputs (extra whitespace,
+reformatted resumes). This cache embeds the normalized JD + resume and
+serves a stored result when a previous request of the same tier, by the
+same user, is similar enough.
+"""
+import re
+import time
+import uuid
+import asyncio
+from collections import deque
+import logging
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, Range,
+    FilterSelector, PayloadSchemaType
+)
+
+from llm_backend.prometheus import observe_dependency, record_cache_lookup
+from llm_backend.circuit_breaker import qdrant_breaker
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_COLLECTION = "scoutiq_llm_cache_semantic"
+
+# Every lookup filters on all three
+PAYLOAD_INDEXES = {
+    "tier": PayloadSchemaType.KEYWORD,
+    "user_uid": PayloadSchemaType.KEYWORD,
+    "created_at": PayloadSchemaType.FLOAT,
+}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so formatting-only edits embed identically"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class SemanticCache:
+    """
+    Qdrant-backed similarity cache for /generate results
+
+    Args:
+        client: Qdrant client
+        embeddings: LangChain embeddings model (the one loaded in lifespan)
+        vector_size: Embedding dimension
+        threshold: Minimum cosine similarity to serve a cached result
+        ttl_seconds: Maximum age of a cached result
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        embeddings,
+        vector_size: int = 512,
+        threshold: float = 0.97,
+        ttl_seconds: int = 24 * 3600,
+        collection_name: str = SEMANTIC_CACHE_COLLECTION
+    ):
+        self.client = client
+        self.embeddings = embeddings
+        self.vector_size = vector_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.collection_name = collection_name
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        # Best similarity seen per lookup, for threshold tuning
+        self._recent_scores = deque(maxlen=100)
+
+    def ensure_collection(self):
+        """Create the cache collection if missing, and any missing payload indexes"""
+        try:
+            info = self.client.get_collection(self.collection_name)
+        except Exception:
+            logger.info(f"Creating collection '{self.collection_name}'...")
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE)
+            )
+            info = self.client.get_collection(self.collection_name)
+
+        # Existing collections predate the user_uid index
+        existing = info.payload_schema or {}
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name not in existing:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
+
+    async def embed(self, jd: str, resume: str) -> list:
+        """Embed the normalized JD + resume pair"""
+        return await self.embeddings.aembed_query(
+            f"{normalize_text(jd)}\n\n{normalize_text(resume)}"
+        )
+
+    async def lookup(self, vector: list, tier: str, user_uid: str):
+        """
+        Find the most similar cached result for this tier and user
+
+        Results are only served back to the user they were generated for:
+        Pro insights and skill gaps are derived from the resume, and a near
+        match can be driven almost entirely by a shared JD.
+
+        Returns:
+            Tuple of (result, score) on a hit, None on a miss
+        """
+        try:
+            with qdrant_breaker.guard(), observe_dependency("qdrant", "query_points"):
+                response = await asyncio.to_thread(
+                    self.client.query_points,
+                    collection_name=self.collection_name,
+                    query=vector,
+                    query_filter=Filter(must=[
+                        FieldCondition(key="tier", match=MatchValue(value=tier)),
+                        FieldCondition(key="user_uid", match=MatchValue(value=user_uid)),
+                        FieldCondition(key="created_at", range=Range(gte=time.time() - self.ttl_seconds)),
+                    ]),
+                    limit=1,
+                    with_payload=["result"]
+                )
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Semantic cache lookup error: {e}")
+            return None
+
+        best = response.points[0] if response.points else None
+        if best is not None:
+            self._recent_scores.append(round(best.score, 4))
+
+        if best is not None and best.score >= self.threshold:
+            self.hits += 1
+            record_cache_lookup("semantic", True)
+            logger.info(f"Semantic cache hit (similarity: {best.score:.4f})")
+            return best.payload["result"], best.score
+
+        self.misses += 1
+        record_cache_lookup("semantic", False)
+        logger.info("Semantic cache miss")
+        return None
+
+    async def store(self, vector: list, cache_key: str, result: dict, tier: str, user_uid: str):
+        """Store a generated result under its exact cache key, owned by user_uid"""
+        try:
+            with qdrant_breaker.guard(), observe_dependency("qdrant", "upsert"):
+                await asyncio.to_thread(
+                    self.client.upsert,
+                    collection_name=self.collection_name,
+                    points=[PointStruct(
+                        # One point per (input, owner): the same input cached for
+                        # two users must not overwrite either owner
+                        id=str(uuid.uuid5(uuid.UUID(cache_key[:32]), user_uid)),
+                        vector=vector,
+                        payload={
+                            "cache_key": cache_key,
+                            "tier": tier,
+                            "user_uid": user_uid,
+                            "result": result,
+                            "created_at": time.time()
+                        }
+                    )]
+                )
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Semantic cache save error: {e}")
+
+    async def purge_expired(self):
+        """Delete cached results older than the TTL"""
+        with qdrant_breaker.guard(), observe_dependency("qdrant", "delete"):
+            await asyncio.to_thread(
+                self.client.delete,
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(filter=Filter(must=[
+                    FieldCondition(key="created_at", range=Range(lt=time.time() - self.ttl_seconds))
+                ]))
+            )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        scores = list(self._recent_scores)
+        return {
+            "enabled": True,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "recent_best_scores": scores[-20:],
+            "recent_near_misses": sum(1 for s in scores if self.threshold - 0.05 <= s < self.threshold),
+        }
@@ -0,0 +1,71 @@
+"""
+Local BM25 sparse vectors for keyword matching
+
+Dense embeddings blur exact requirements ("Kubernetes", "SOC 2", "C#"),
+so candidates also get a sparse keyword vector, computed here without any
+external service:
+- documents: BM25 term-frequency weights (saturation k1, length norm b)
+- queries: weight 1 per distinct term
+
+The IDF half of BM25 is applied by Qdrant (the sparse vector is configured
+with Modifier.IDF), so it tracks the collection as it grows. Terms are
+hashed to 32-bit indices, so no vocabulary has to be stored.
+"""
+import os
+import re
+import hashlib
+from collections import Counter
+from typing import List
+
+from qdrant_client.models import SparseVector
+
+# Keeps tech tokens whole: c++, c#, node.js, ci/cd -> "ci", "cd", soc-2
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[.\-][a-z0-9+#]+)*")
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be been before being below between both
+but by can could did do does doing down during each etc few for from further had has have having
+he her here hers him his how i if in into is it its itself just me more most my no nor not of off
+on once only or other our ours out over own per same she should so some such than that the their
+them then there these they this those through to too under until up very via was we were what
+when where which while who whom why will with would you your yours
+""".split())
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Typical candidate embedding text length, for BM25 length normalization
+BM25_AVG_DOC_TOKENS = int(os.getenv("BM25_AVG_DOC_TOKENS", "300"))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms without stopwords"""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def term_index(term: str) -> int:
+    """Stable 32-bit index for a term (Qdrant sparse indices are uint32)"""
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=4).digest(), "little")
+
+
+def _vector(weights: dict) -> SparseVector:
+    # Hash collisions just add up
+    merged = Counter()
+    for term, weight in weights.items():
+        merged[term_index(term)] += weight
+    indices = sorted(merged)
+    return SparseVector(indices=indices, values=[float(merged[i]) for i in indices])
+
+
+def encode_document(text: str) -> SparseVector:
+    """BM25 term-frequency weights for one candidate document"""
+    counts = Counter(tokenize(text))
+    length_norm = 1 - BM25_B + BM25_B * sum(counts.values()) / BM25_AVG_DOC_TOKENS
+    return _vector({
+        term: tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+        for term, tf in counts.items()
+    })
+
+
+def encode_query(text: str) -> SparseVector:
+    """One unit weight per distinct query term (empty if the text has no terms)"""
+    return _vector({term: 1.0 for term in set(tokenize(text))})
@@ -0,0 +1,140 @@
+"""
+User tier resolution with a per-process cache
+
+Tier lookups hit Firestore's pro_users collection on every request. This
+module caches the result per worker with a short TTL (including negative
+results for free users) and evicts entries as soon as the Gumroad webhook
+publishes an upgrade marker to the tier_invalidations collection.
+"""
+import os
+import time
+import threading
+from datetime import datetime, timezone
+from firebase_admin import firestore
+import logging
+
+from llm_backend.firestore_io import run_firestore
+from llm_backend.prometheus import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+PRO_TIERS = ("monthly", "yearly", "lifetime")
+INVALIDATION_COLLECTION = "tier_invalidations"
+
+
+class TierCache:
+    """
+    TTL cache of email -> tier
+
+    Args:
+        ttl_seconds: How long a paid tier stays cached
+        negative_ttl_seconds: How long a "free" (no pro_users doc) result stays cached
+    """
+
+    def __init__(self, ttl_seconds: float = 120, negative_ttl_seconds: float = 60):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries = {}  # email -> (expires_at, tier)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, email: str):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(email, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, email: str, tier: str):
+        ttl = self.negative_ttl_seconds if tier == "free" else self.ttl_seconds
+        with self._lock:
+            self._entries[email] = (time.monotonic() + ttl, tier)
+
+    def invalidate(self, email: str):
+        with self._lock:
+            if self._entries.pop(email, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+                "negative_ttl_seconds": self.negative_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+tier_cache = TierCache(
+    ttl_seconds=float(os.getenv("TIER_CACHE_TTL_SECONDS", "120")),
+    negative_ttl_seconds=float(os.getenv("TIER_CACHE_NEGATIVE_TTL_SECONDS", "60")),
+)
+
+
+async def get_user_tier(email: str, db: "firestore.Client") -> tuple:
+    """
+    Resolve a user's tier, serving from the per-process cache when possible
+
+    Args:
+        email: User's email
+        db: Firestore client
+
+    Returns:
+        Tuple of (is_pro, tier). Lookup failures fall back to free and are not cached.
+    """
+    email = email.lower()
+    tier = tier_cache.get(email)
+    record_cache_lookup("tier", tier is not None)
+
+    if tier is None:
+        try:
+            doc = await run_firestore(db.collection("pro_users").document(email).get)
+            tier = doc.to_dict().get("tier", "free") if doc.exists else "free"
+            tier_cache.set(email, tier)
+        except Exception as e:
+            logger.error(f"Failed to check user tier: {e}")
+            return False, "free"
+
+    return tier in PRO_TIERS, tier
+
+
+def start_invalidation_listener(db: "firestore.Client"):
+    """
+    Evict cached tiers when upgrade markers are written to tier_invalidations
+
+    Only markers written after startup are watched. Returns the Firestore
+    watch handle (call .unsubscribe() on shutdown) or None if it could not start.
+    """
+    def on_snapshot(col_snapshot, changes, read_time):
+        for change in changes:
+            email = change.document.id
+            tier_cache.invalidate(email)
+            logger.info(f"Tier cache invalidated for {email}")
+
+    try:
+        query = db.collection(INVALIDATION_COLLECTION).where(
+            "updated_at", ">=", datetime.now(timezone.utc)
+        )
+        watch = query.on_snapshot(on_snapshot)
+        logger.info("Tier invalidation listener started.")
+        return watch
+    except Exception as e:
+        logger.error(f"Tier invalidation listener failed to start: {e}")
+        return None
+
+
+def publish_tier_invalidation(email: str, tier: str, db: "firestore.Client"):
+    """Write an upgrade marker so every backend worker drops its cached tier"""
+    db.collection(INVALIDATION_COLLECTION).document(email.lower()).set({
+        "tier": tier,
+        "updated_at": firestore.SERVER_TIMESTAMP
+    })
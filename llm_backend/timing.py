@@ -0,0 +1,61 @@
+"""
+Per-stage request timing
+
+The request middleware opens a RequestTimings for each request; handlers and
+dependencies wrap their stages in span("name"). When the response is ready
+the middleware turns the collected stages into a Server-Timing header, the
+per-stage Prometheus histogram and a "stages" map on the api_metrics doc.
+
+Spans outside a request (background tasks, startup) are no-ops.
+"""
+import time
+import contextvars
+from contextlib import contextmanager
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Accumulated seconds per stage name, in first-seen order"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name: str, duration: float):
+        self.stages[name] = self.stages.get(name, 0.0) + duration
+
+    def server_timing(self, total: float = None) -> str:
+        """Format as a Server-Timing header value (durations in milliseconds)"""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def request_timing():
+    """Collect spans for the current request (used by the middleware)"""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time one stage of the current request
+
+    Example:
+        with span("llm"):
+            response = await call_llm_with_retry(llm, prompt)
+    """
+    timings = _current_timings.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
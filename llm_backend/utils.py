@@ -1,13 +1,191 @@
 """
 Utility functions for response parsing and LLM interactions
 """
+import os
 import re
+import time
+import heapq
+import asyncio
+import itertools
 import logging
+from collections import deque
+from contextlib import asynccontextmanager
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from groq import RateLimitError
 
+from llm_backend.prometheus import (
+    observe_dependency, LLM_QUEUE_TIME, LLM_QUEUE_DEPTH, LLM_IN_FLIGHT, LLM_HEDGES
+)
+from llm_backend.prompts import estimate_prompt_tokens, FREE_TIER_OUTPUT_TOKENS
+from llm_backend.rate_governor import RateGovernor, groq_governor, MAX_GOVERNOR_WAIT_SECONDS
+from llm_backend.circuit_breaker import llm_breaker
+
 logger = logging.getLogger(__name__)
 
+# Lower runs first; unknown tiers are treated as free
+TIER_PRIORITY = {"lifetime": 0, "yearly": 1, "monthly": 2, "free": 3}
+
+
+class LLMScheduler:
+    """
+    Priority-aware concurrency limiter for LLM calls
+
+    At most `max_in_flight` calls run at once per worker; the rest wait in a
+    heap ordered by:
+    1. tier (lifetime > yearly > monthly > free)
+    2. interactive before batch
+    3. per-user fair share: each user's queued calls get increasing virtual
+       start tags, so one user's burst interleaves with everyone else's
+       requests instead of queueing ahead of them
+    4. arrival order
+
+    With a rate governor, a call also needs request/token budget to start.
+    Budget goes to the head of the queue: while it is short, no slot is
+    taken and lower-priority calls can't overtake, and dispatch resumes
+    once the budget has refilled.
+
+    Args:
+        max_in_flight: Concurrent LLM calls allowed in this process
+        governor: Provider rate budget (None: concurrency limit only)
+    """
+
+    def __init__(self, max_in_flight: int = 8, governor: RateGovernor = None):
+        self.max_in_flight = max_in_flight
+        self.governor = governor
+        self._in_flight = 0
+        self._heap = []  # (tier_rank, batch, tag, seq, future, enqueued_at, tokens)
+        self._budget_timer = None  # Re-runs _grant once the budget should have refilled
+        self._budget_blocked_since = None  # When the head of the queue started waiting for budget
+        self._seq = itertools.count()
+        self._virtual_time = 0
+        self._user_tags = {}  # user -> virtual tag of their latest queued call
+        self.dispatched = 0
+        self.queued_total = 0
+        self.max_wait = 0.0
+
+    def _tag(self, user: str) -> int:
+        tag = max(self._virtual_time, self._user_tags.get(user, 0)) + 1
+        self._user_tags[user] = tag
+        if len(self._user_tags) > 10_000:
+            # Users without a backlog carry no fairness state worth keeping
+            self._user_tags = {u: t for u, t in self._user_tags.items() if t > self._virtual_time}
+        return tag
+
+    def _reserve_budget(self, tokens: int) -> float:
+        """0 if a call may start now (budget spent), else seconds to wait for budget"""
+        if self.governor is None:
+            return 0.0
+        now = time.monotonic()
+        blocked_since = self._budget_blocked_since or now
+        wait = self.governor.reserve(tokens, force=now - blocked_since >= MAX_GOVERNOR_WAIT_SECONDS)
+        if wait > 0:
+            self._budget_blocked_since = blocked_since
+            return wait
+        self._budget_blocked_since = None
+        self.governor.record_wait(now - blocked_since, tokens)
+        return 0.0
+
+    def _wait_for_budget(self, wait: float):
+        if self._budget_timer is not None:
+            self._budget_timer.cancel()
+        self._budget_timer = asyncio.get_running_loop().call_later(
+            min(wait, MAX_GOVERNOR_WAIT_SECONDS), self._on_budget_refilled
+        )
+
+    def _on_budget_refilled(self):
+        self._budget_timer = None
+        self._grant()
+
+    def _grant(self):
+        while self._heap and self._in_flight < self.max_in_flight:
+            _, _, tag, _, future, _, tokens = self._heap[0]
+            if future.done():  # Waiter was cancelled
+                heapq.heappop(self._heap)
+                continue
+            wait = self._reserve_budget(tokens)
+            if wait > 0:
+                self._wait_for_budget(wait)
+                return
+            heapq.heappop(self._heap)
+            LLM_QUEUE_DEPTH.dec()
+            self._virtual_time = max(self._virtual_time, tag)
+            self._in_flight += 1
+            future.set_result(None)
+        if not self._heap:
+            self._budget_blocked_since = None
+
+    def _release(self):
+        self._in_flight -= 1
+        LLM_IN_FLIGHT.dec()
+        self._grant()
+
+    @asynccontextmanager
+    async def slot(self, tier: str = "free", user: str = None, interactive: bool = True, tokens: int = 0):
+        """
+        Hold one LLM slot for the duration of the block
+
+        `tokens` (prompt + completion estimate) is reserved from the
+        governor before the slot is granted.
+
+        Example:
+            async with llm_scheduler.slot(tier, user_uid, tokens=1500):
+                response = await llm.ainvoke(prompt)
+        """
+        mode = "interactive" if interactive else "batch"
+        start = time.perf_counter()
+
+        if self._in_flight < self.max_in_flight and not self._heap and self._reserve_budget(tokens) == 0:
+            self._in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = (
+                TIER_PRIORITY.get(tier, TIER_PRIORITY["free"]),
+                0 if interactive else 1,
+                self._tag(user or "anonymous"),
+                next(self._seq),
+                future,
+                start,
+                tokens,
+            )
+            heapq.heappush(self._heap, entry)
+            self.queued_total += 1
+            LLM_QUEUE_DEPTH.inc()
+            self._grant()  # Heap may only hold cancelled entries
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    LLM_QUEUE_DEPTH.dec()
+                else:
+                    # Granted a slot in the same tick we were cancelled
+                    self._in_flight -= 1
+                    self._grant()
+                raise
+
+        waited = time.perf_counter() - start
+        self.max_wait = max(self.max_wait, waited)
+        self.dispatched += 1
+        LLM_QUEUE_TIME.labels(tier, mode).observe(waited)
+        LLM_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "queued": sum(1 for entry in self._heap if not entry[4].done()),
+            "queued_total": self.queued_total,
+            "dispatched": self.dispatched,
+            "max_wait_seconds": round(self.max_wait, 3),
+            "waiting_for_budget": self._budget_timer is not None,
+        }
+
+
+llm_scheduler = LLMScheduler(max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")), governor=groq_governor)
+
 
 @retry(
     stop=stop_after_attempt(3),
@@ -15,7 +193,15 @@ logger = logging.getLogger(__name__)
     retry=retry_if_exception_type((RateLimitError, ConnectionError, TimeoutError)),
     reraise=True
 )
-async def call_llm_with_retry(llm, prompt: str):
+async def call_llm_with_retry(
+    llm,
+    prompt: str,
+    tier: str = "free",
+    user: str = None,
+    interactive: bool = True,
+    output_tokens: int = FREE_TIER_OUTPUT_TOKENS,
+    on_dispatch=None
+):
     """
     Wrapper function that retries LLM calls on failure.
     
@@ -23,20 +209,319 @@ async def call_llm_with_retry(llm, prompt: str):
     - Retries 3 times
     - Exponential backoff: 2s, 4s, 8s
     - Only retries on rate limits, connection errors, timeouts
+
+    Each attempt waits for a slot from llm_scheduler (released during
+    backoff so retries don't block other users), which is only granted
+    once groq_governor has enough request/token budget for the call.
     
     Args:
         llm: LLM client (ChatGroq or structured LLM)
         prompt: The prompt to send
+        tier: Caller's tier (scheduling priority)
+        user: Caller's uid (per-user fairness)
+        interactive: False for batch work, which yields to interactive calls
+        output_tokens: Expected completion size, budgeted with the prompt
+        on_dispatch: Optional callable, called when an attempt gets its slot
         
     Returns:
         LLM response object
     """
-    logger.info("Calling LLM...")
-    response = await llm.ainvoke(prompt)
+    async with llm_scheduler.slot(tier, user, interactive, tokens=estimate_prompt_tokens(prompt) + output_tokens):
+        if on_dispatch:
+            on_dispatch()
+        logger.info("Calling LLM...")
+        with llm_breaker.guard(), observe_dependency("llm", "invoke"):
+            response = await llm.ainvoke(prompt)
     logger.info("LLM response received")
     return response
 
 
+class LLMHedger:
+    """
+    Tail-latency hedging for LLM calls
+
+    If the primary call hasn't produced a valid response by the deadline
+    (a percentile of recent primary latencies, both measured from when the
+    call got its scheduler slot, so queueing never triggers a hedge), a
+    second request is sent to
+    `fallback_llm` (or the same model). The first valid response wins and
+    the other call is cancelled. Hedges go through the scheduler and rate
+    governor like any other call, so their cost stays inside the quota.
+
+    Args:
+        enabled: Hedge at all (off: plain call_llm_with_retry)
+        percentile: Latency percentile used as the hedge deadline (0.0 - 1.0)
+        min_delay: Lower bound on the deadline in seconds
+        initial_delay: Deadline until enough latencies have been observed
+        window: Number of recent primary latencies kept
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 0.95,
+        min_delay: float = 2.0,
+        initial_delay: float = 10.0,
+        window: int = 200
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.fallback_llm = None
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.failures = 0
+
+    def deadline(self) -> float:
+        if len(self._latencies) < 20:
+            return self.initial_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    async def call(self, llm, prompt: str, validate=None, **kwargs):
+        """
+        Call the LLM, hedging slow or invalid primary responses
+
+        Args:
+            llm: Primary LLM client
+            prompt: The prompt to send
+            validate: Optional callable(response) -> bool; invalid responses don't win
+            **kwargs: Passed to call_llm_with_retry (tier, user, output_tokens, ...)
+
+        Returns:
+            The winning LLM response
+        """
+        if not self.enabled:
+            return await call_llm_with_retry(llm, prompt, **kwargs)
+
+        self.calls += 1
+        deadline = self.deadline()
+        dispatches = []  # When each primary attempt got its scheduler slot
+        dispatched = asyncio.Event()
+
+        def on_dispatch():
+            dispatches.append(time.perf_counter())
+            dispatched.set()
+
+        primary = asyncio.create_task(call_llm_with_retry(llm, prompt, on_dispatch=on_dispatch, **kwargs))
+        pending = {primary}
+        hedge = None
+        error = None
+
+        # The deadline only starts once the primary is actually running
+        dispatch_wait = asyncio.create_task(dispatched.wait())
+        try:
+            await asyncio.wait({primary, dispatch_wait}, return_when=asyncio.FIRST_COMPLETED)
+
+            while pending:
+                timeout = None
+                if hedge is None and not primary.done():
+                    timeout = max(0.0, deadline - (time.perf_counter() - dispatches[-1]))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task is primary and dispatches:
+                        self._latencies.append(time.perf_counter() - dispatches[-1])
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    if validate is None or validate(response):
+                        if task is hedge:
+                            self.hedge_wins += 1
+                            LLM_HEDGES.labels("hedge_won").inc()
+                        else:
+                            self.primary_wins += 1
+                        return response
+                    logger.warning("LLM returned an unparseable response")
+
+                if hedge is None:
+                    running_for = time.perf_counter() - dispatches[-1] if dispatches else 0.0
+                    if not primary.done() and running_for < deadline:
+                        continue  # Primary was re-dispatched by a retry; its deadline restarted
+                    # Deadline passed, or the primary already failed: send the backup
+                    self.hedges_fired += 1
+                    LLM_HEDGES.labels("fired").inc()
+                    logger.info(f"Hedging LLM call after {running_for:.1f}s running (deadline {deadline:.1f}s)")
+                    hedge = asyncio.create_task(
+                        call_llm_with_retry(self.fallback_llm or llm, prompt, **kwargs)
+                    )
+                    pending.add(hedge)
+        finally:
+            dispatch_wait.cancel()
+            for task in pending:
+                if task is primary and dispatches:
+                    # Lower bound on the primary latency; keeps the deadline from drifting down
+                    self._latencies.append(time.perf_counter() - dispatches[-1])
+                task.cancel()
+
+        self.failures += 1
+        if error:
+            raise error
+        raise ValueError("LLM returned no parseable response")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "fallback_model": getattr(self.fallback_llm, "model_name", None),
+            "deadline_seconds": round(self.deadline(), 2),
+            "calls": self.calls,
+            "hedges_fired": self.hedges_fired,
+            "hedge_rate": round(self.hedges_fired / self.calls, 4) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "failures": self.failures,
+        }
+
+
+llm_hedger = LLMHedger(
+    enabled=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+    percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+    min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2")),
+    initial_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", "10"))
+)
+
+
+STREAM_RETRYABLE_ERRORS = (RateLimitError, ConnectionError, TimeoutError)
+
+
+async def stream_llm_with_retry(
+    llm,
+    prompt: str,
+    attempts: int = 3,
+    tier: str = "free",
+    user: str = None,
+    interactive: bool = True,
+    output_tokens: int = FREE_TIER_OUTPUT_TOKENS
+):
+    """
+    Stream LLM output as text chunks, retrying failures before the first chunk.
+
+    Once any text has been yielded a failure is re-raised, since the caller
+    has already forwarded partial output. A scheduler slot is held for the
+    whole stream.
+
+    Args:
+        llm: LLM client (ChatGroq)
+        prompt: The prompt to send
+        attempts: Maximum number of attempts
+        tier, user, interactive: Scheduling priority (see call_llm_with_retry)
+        output_tokens: Expected completion size, budgeted with the prompt
+
+    Yields:
+        Text chunks as they arrive
+    """
+    for attempt in range(1, attempts + 1):
+        started = False
+        try:
+            tokens = estimate_prompt_tokens(prompt) + output_tokens
+            async with llm_scheduler.slot(tier, user, interactive, tokens=tokens):
+                logger.info("Streaming LLM...")
+                with llm_breaker.guard(), observe_dependency("llm", "stream"):
+                    async for chunk in llm.astream(prompt):
+                        if chunk.content:
+                            started = True
+                            yield chunk.content
+            logger.info("LLM stream complete")
+            return
+        except STREAM_RETRYABLE_ERRORS as e:
+            if started or attempt == attempts:
+                raise
+            wait = min(2 ** attempt, 10)
+            logger.warning(f"LLM stream failed ({e}), retrying in {wait}s")
+            await asyncio.sleep(wait)
+
+
+class StreamingSectionParser:
+    """
+    Incrementally parses streamed LLM output into question/insight events
+
+    Mirrors the section rules of clean_response() and parse_pro_response(),
+    but works line by line so each question can be emitted as soon as its
+    line is complete. The final result should still come from
+    parse_pro_response() on the full text.
+
+    Events are dicts:
+    - {"event": "question", "section": "technical", "text": "..."}
+    - {"event": "insight_summary", "text": "..."}
+    - {"event": "skill_gaps", "text": "..."}
+    """
+
+    QUESTION_SECTION_RE = re.compile(
+        r"(?i)^\s*(technical questions|behavioral questions|red flag\s*/\s*follow[- ]?up questions)[::]\s*$"
+    )
+
+    def __init__(self):
+        self._buffer = ""
+        self._section = None
+        self._block = []
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk of text and return events for completed lines"""
+        self._buffer += chunk.replace("\\n", "\n")
+        events = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            events.extend(self._handle_line(line))
+        return events
+
+    def finish(self) -> list:
+        """Flush the trailing partial line and any open text section"""
+        events = []
+        if self._buffer:
+            events.extend(self._handle_line(self._buffer))
+            self._buffer = ""
+        events.extend(self._close_block())
+        return events
+
+    def _close_block(self) -> list:
+        if self._section not in ("insight_summary", "skill_gaps"):
+            return []
+        text = "\n".join(self._block).strip()
+        self._block = []
+        return [{"event": self._section, "text": text}] if text else []
+
+    def _handle_line(self, line: str) -> list:
+        line = line.replace("```", "")
+
+        for marker, section in (("===INSIGHT SUMMARY===", "insight_summary"), ("===SKILL GAPS===", "skill_gaps")):
+            if marker in line:
+                events = self._close_block()
+                self._section = section
+                remainder = line.split(marker, 1)[1]
+                self._block = [remainder] if remainder.strip() else []
+                return events
+
+        header = self.QUESTION_SECTION_RE.match(line)
+        if header:
+            events = self._close_block()
+            label = header.group(1).lower()
+            if label.startswith("technical"):
+                self._section = "technical"
+            elif label.startswith("behavioral"):
+                self._section = "behavioral"
+            else:
+                self._section = "followup"
+            return events
+
+        if self._section in ("insight_summary", "skill_gaps"):
+            self._block.append(line)
+            return []
+
+        if self._section in ("technical", "behavioral", "followup"):
+            question = re.search(r"[-•]\s+(.*)", line)
+            if question:
+                return [{"event": "question", "section": self._section, "text": question.group(1)}]
+
+        return []
+
+
 def parse_pro_response(raw_output: str) -> dict:
     """
     Parses the combined Pro response into structured sections
@@ -0,0 +1,377 @@
+"""
+Candidate vector index (Qdrant)
+
+Ranking reads straight from Qdrant: the compact display fields (name,
+email, summary, skills) are stored in each point's payload at ingest, so
+a ranking is one embedding lookup plus one query_points call, with no
+Firestore round trip. Full candidate documents stay in Firestore and are
+fetched on demand.
+
+Each point carries two vectors:
+- the unnamed dense Voyage embedding (semantic match)
+- "bm25", a sparse keyword vector from llm_backend.sparse (exact terms)
+
+Searches run both legs and fuse them with reciprocal-rank fusion in a
+single query, so keyword-heavy JDs ("Kubernetes", "SOC 2") rank candidates
+that name those terms without an extra rerank pass.
+
+Payload layout (kept from the langchain Qdrant wrapper used before):
+{"page_content": ..., "metadata": {...}}.
+
+Every search is scoped to one user, so the collection is laid out for
+multitenancy: metadata.user_uid is a tenant keyword index (points are
+co-located per user) and HNSW links are built per tenant (payload_m)
+instead of one global graph (m=0). Filtered searches then stay as fast
+with many users as with one. ensure_collection_schema() applies this
+layout to existing collections too.
+"""
+import os
+import asyncio
+import tempfile
+from contextlib import contextmanager
+from typing import List, Optional
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-worker lock, single-process dev servers
+    fcntl = None
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, SparseVectorParams, Modifier, PointStruct, Filter, FieldCondition,
+    MatchValue, PayloadSelectorInclude, Prefetch, FusionQuery, Fusion, HnswConfigDiff,
+    KeywordIndexParams, KeywordIndexType, IntegerIndexParams, IntegerIndexType,
+    CreateAliasOperation, CreateAlias
+)
+
+from llm_backend.prometheus import observe_dependency
+from llm_backend.circuit_breaker import qdrant_breaker
+from llm_backend.sparse import encode_document, encode_query
+
+logger = logging.getLogger(__name__)
+
+CANDIDATE_COLLECTION = "scoutiq_resumes_v3"
+# Dense-only collection from before hybrid search; copied into v3 on startup
+LEGACY_CANDIDATE_COLLECTION = "scoutiq_resumes_v2"
+# Alias of the new collection, created once the legacy copy has completed
+MIGRATION_MARKER_ALIAS = f"{LEGACY_CANDIDATE_COLLECTION}_migrated"
+SPARSE_VECTOR = "bm25"
+
+# Candidates each search leg contributes to the fusion
+HYBRID_PREFETCH_LIMIT = int(os.getenv("HYBRID_PREFETCH_LIMIT", "50"))
+MIGRATION_BATCH_SIZE = 256
+
+# Per-tenant HNSW graphs only: every candidate search filters on user_uid
+TENANT_HNSW_CONFIG = HnswConfigDiff(m=0, payload_m=16)
+
+# Payload indexes: the tenant key plus fields candidates can be filtered on
+PAYLOAD_INDEXES = {
+    "metadata.user_uid": KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True),
+    "metadata.firestore_id": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+    "metadata.experience_count": IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=True),
+    "metadata.skills_count": IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=True),
+}
+
+# Payload fields returned with ranking results (page_content is left out)
+RANK_PAYLOAD_FIELDS = [
+    "metadata.firestore_id",
+    "metadata.full_name",
+    "metadata.email",
+    "metadata.summary",
+    "metadata.skills",
+    "metadata.experience_count",
+]
+
+
+def user_filter(user_uid: str) -> Filter:
+    return Filter(must=[FieldCondition(key="metadata.user_uid", match=MatchValue(value=user_uid))])
+
+
+@contextmanager
+def host_lock(name: str):
+    """
+    Non-blocking exclusive lock shared by the workers on this host
+
+    Yields True if this process holds the lock, False if another one does.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "w") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class CandidateIndex:
+    """
+    Ingest and search over users' parsed resumes
+
+    Args:
+        client: Qdrant client
+        embeddings: Embeddings model for the dense vectors
+        collection_name: Candidate collection
+        vector_size: Embedding dimensions
+        hybrid: Fuse in the sparse keyword leg when searching
+    """
+
+    def __init__(
+        self,
+        client: QdrantClient,
+        embeddings: Embeddings,
+        collection_name: str = CANDIDATE_COLLECTION,
+        vector_size: int = 512,
+        hybrid: bool = True
+    ):
+        self.client = client
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.vector_size = vector_size
+        self.hybrid = hybrid
+
+    def ensure_collection(self):
+        """Create the candidate collection if missing, update its schema and copy over legacy points"""
+        try:
+            self.client.get_collection(self.collection_name)
+            logger.info(f"Collection '{self.collection_name}' exists.")
+        except Exception:
+            logger.info(f"Creating collection '{self.collection_name}'...")
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=self.vector_size, distance=Distance.COSINE),
+                # Qdrant applies IDF at query time; documents only carry BM25 term weights
+                sparse_vectors_config={SPARSE_VECTOR: SparseVectorParams(modifier=Modifier.IDF)},
+                hnsw_config=TENANT_HNSW_CONFIG
+            )
+            logger.info("Collection created.")
+        self.ensure_collection_schema()
+        self.migrate_legacy_points()
+
+    def ensure_collection_schema(self):
+        """
+        Apply the tenant layout and payload indexes (idempotent)
+
+        Creates missing payload indexes, recreates ones whose parameters
+        changed (e.g. a plain user_uid index without is_tenant) and updates
+        the HNSW config; already-current settings are left alone.
+        """
+        info = self.client.get_collection(self.collection_name)
+        existing = info.payload_schema or {}
+
+        for field_name, params in PAYLOAD_INDEXES.items():
+            current = existing.get(field_name)
+            if current is not None and self._index_matches(current, params):
+                continue
+            if current is not None:
+                logger.info(f"Recreating payload index '{field_name}' with new parameters...")
+                self.client.delete_payload_index(self.collection_name, field_name, wait=True)
+            else:
+                logger.info(f"Creating payload index '{field_name}'...")
+            self.client.create_payload_index(self.collection_name, field_name, field_schema=params, wait=True)
+
+        hnsw = info.config.hnsw_config
+        if hnsw.m != TENANT_HNSW_CONFIG.m or hnsw.payload_m != TENANT_HNSW_CONFIG.payload_m:
+            logger.info(f"Switching '{self.collection_name}' to per-tenant HNSW (m=0, payload_m=16)...")
+            self.client.update_collection(self.collection_name, hnsw_config=TENANT_HNSW_CONFIG)
+
+    @staticmethod
+    def _index_matches(current, params) -> bool:
+        """Whether an existing index (payload_schema entry) has the wanted type and flags"""
+        if current.data_type != params.type:
+            return False
+        current_params = current.params
+        wanted = params.model_dump(exclude_none=True, exclude={"type"})
+        if not wanted:
+            return True
+        if current_params is None:
+            return False
+        return all(getattr(current_params, key, None) == value for key, value in wanted.items())
+
+    def migrate_legacy_points(self):
+        """
+        Copy points from the dense-only collection, adding sparse vectors
+
+        Qdrant can't add a vector to an existing collection, hence the copy.
+        Completion is recorded explicitly as MIGRATION_MARKER_ALIAS; until
+        then the copy is re-run on startup, skipping points already in the
+        new collection (re-ingested resumes keep their newer payload). One
+        worker per host copies while the others start without waiting;
+        copies on other hosts are harmless, as point ids are kept.
+        """
+        if not self.client.collection_exists(LEGACY_CANDIDATE_COLLECTION) or self._migration_done():
+            return
+
+        with host_lock(f"{self.collection_name}_migration") as acquired:
+            if not acquired:
+                logger.info("Legacy candidate copy is running in another worker.")
+                return
+            # Another worker may have finished between the check and the lock
+            if self._migration_done():
+                return
+            self._copy_legacy_points()
+            self.client.update_collection_aliases(change_aliases_operations=[
+                CreateAliasOperation(create_alias=CreateAlias(
+                    collection_name=self.collection_name,
+                    alias_name=MIGRATION_MARKER_ALIAS
+                ))
+            ])
+
+    def _migration_done(self) -> bool:
+        aliases = self.client.get_collection_aliases(self.collection_name).aliases
+        return any(alias.alias_name == MIGRATION_MARKER_ALIAS for alias in aliases)
+
+    def _copy_legacy_points(self):
+        logger.info(f"Copying candidates from '{LEGACY_CANDIDATE_COLLECTION}'...")
+        copied = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                LEGACY_CANDIDATE_COLLECTION,
+                limit=MIGRATION_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            existing = {
+                point.id for point in self.client.retrieve(
+                    self.collection_name, ids=[point.id for point in points], with_payload=False
+                )
+            } if points else set()
+            missing = [point for point in points if point.id not in existing]
+            if missing:
+                self.client.upsert(self.collection_name, points=[
+                    PointStruct(
+                        id=point.id,
+                        vector={
+                            "": point.vector,
+                            SPARSE_VECTOR: encode_document(point.payload.get("page_content", ""))
+                        },
+                        payload=point.payload
+                    )
+                    for point in missing
+                ])
+                copied += len(missing)
+            if offset is None:
+                break
+        logger.info(f"Copied {copied} candidates into '{self.collection_name}'.")
+
+    async def embed_query(self, text: str) -> list:
+        return await self.embeddings.aembed_query(text)
+
+    async def add_documents(self, docs: List[Document], ids: List[str], batch_size: int = 64):
+        """
+        Embed and upsert candidate documents
+
+        Dense vectors come from one aembed_documents call (the embeddings
+        model splits it into API batches); sparse vectors are computed
+        locally. Points are upserted batch_size at a time.
+        """
+        texts = [doc.page_content for doc in docs]
+        dense = await self.embeddings.aembed_documents(texts)
+        points = [
+            PointStruct(
+                id=point_id,
+                vector={"": vector, SPARSE_VECTOR: encode_document(text)},
+                payload={"page_content": text, "metadata": doc.metadata}
+            )
+            for point_id, doc, text, vector in zip(ids, docs, texts, dense)
+        ]
+
+        for start in range(0, len(points), batch_size):
+            with qdrant_breaker.guard(), observe_dependency("qdrant", "upsert"):
+                await asyncio.to_thread(
+                    self.client.upsert,
+                    collection_name=self.collection_name,
+                    points=points[start:start + batch_size]
+                )
+
+    def _hybrid_prefetch(
+        self,
+        vector: list,
+        text: str,
+        user_uid: str,
+        limit: int,
+        score_threshold: Optional[float]
+    ) -> List[Prefetch]:
+        """Dense and sparse legs for RRF; empty if the text has no keywords"""
+        keywords = encode_query(text)
+        if not keywords.indices:
+            return []
+
+        dense_leg = Prefetch(
+            query=vector,
+            filter=user_filter(user_uid),
+            limit=limit,
+            score_threshold=score_threshold
+        )
+        if score_threshold is None:
+            sparse_leg = Prefetch(query=keywords, using=SPARSE_VECTOR, filter=user_filter(user_uid), limit=limit)
+        else:
+            # Only rescore candidates above the similarity threshold, so
+            # keyword matches can't bring back weaker candidates
+            sparse_leg = Prefetch(prefetch=[dense_leg], query=keywords, using=SPARSE_VECTOR, limit=limit)
+        return [dense_leg, sparse_leg]
+
+    async def search(
+        self,
+        vector: list,
+        user_uid: str,
+        limit: int = 10,
+        offset: int = 0,
+        score_threshold: Optional[float] = None,
+        text: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Best-matching candidates of one user, one page at a time
+
+        Args:
+            vector: Query embedding
+            user_uid: Owner of the candidates
+            limit: Page size
+            offset: Candidates to skip (rank of the first result minus one)
+            score_threshold: Minimum dense (cosine) similarity, applied by Qdrant
+            text: Query text for the keyword leg (dense-only search without it)
+
+        Returns:
+            Candidates in rank order: the payload's display fields plus
+            "relevance_score" (fused RRF score for hybrid searches, cosine
+            similarity otherwise) and "rank"
+        """
+        prefetch = []
+        if self.hybrid and text:
+            prefetch = self._hybrid_prefetch(
+                vector, text, user_uid, max(HYBRID_PREFETCH_LIMIT, offset + limit), score_threshold
+            )
+
+        if prefetch:
+            query = dict(prefetch=prefetch, query=FusionQuery(fusion=Fusion.RRF))
+        else:
+            query = dict(query=vector, query_filter=user_filter(user_uid), score_threshold=score_threshold)
+
+        with qdrant_breaker.guard(), observe_dependency("qdrant", "query_points"):
+            response = await asyncio.to_thread(
+                self.client.query_points,
+                collection_name=self.collection_name,
+                limit=limit,
+                offset=offset,
+                with_payload=PayloadSelectorInclude(include=RANK_PAYLOAD_FIELDS),
+                **query
+            )
+
+        return [
+            {
+                **(point.payload or {}).get("metadata", {}),
+                "relevance_score": round(point.score, 3),
+                "rank": offset + i + 1,
+            }
+            for i, point in enumerate(response.points)
+        ]
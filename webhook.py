@@ -6,6 +6,7 @@ import os
 import smtplib
 from email.message import EmailMessage
 from typing import Annotated
+from llm_backend.tiers import publish_tier_invalidation
 
 app = FastAPI()
 
@@ -80,6 +81,11 @@ async def gumroad_webhook(
             "source": "gumroad",
             "created_at": firestore.SERVER_TIMESTAMP
         })
+        # Tell backend workers to drop any cached (free) tier for this user
+        try:
+            publish_tier_invalidation(email, tier, db)
+        except Exception as e:
+            print(f"❌ Failed to publish tier invalidation for {email}: {e}")
         send_confirmation_email(email, tier)
 
         return JSONResponse(